@@ -0,0 +1,136 @@
+"""
+Edge bookkeeping cost on large editor graphs: the old list scans against
+EdgeIndex, for connecting, dragging (finding a node's edges) and deleting
+a node. Uses plain stand-ins for NodeWidget/EdgeWidget so no display is
+needed.
+
+    python -m benchmarks.bench_canvas_edges
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+# ui modules import each other as ``ui.*``, the way pymacro/run.py runs them
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "pymacro"))
+
+from ui.adjacency import EdgeIndex  # noqa: E402
+
+
+class Node:
+    def __init__(self):
+        self.incoming = []
+        self.outgoing = []
+
+
+class Edge:
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+        source.outgoing.append(target)
+        target.incoming.append(source)
+
+
+class ListStore:
+    """The previous GraphCanvas bookkeeping: flat lists scanned on every call."""
+
+    def __init__(self):
+        self.nodes = []
+        self.edges = []
+
+    def connect(self, source, target):
+        self.edges.append(Edge(source, target))
+
+    def drag(self, node):
+        return [e for e in self.edges if e.source == node or e.target == node]
+
+    def remove_edge(self, edge):
+        if edge.source in self.nodes and edge.target in self.nodes:
+            edge.source.outgoing.remove(edge.target)
+            edge.target.incoming.remove(edge.source)
+        if edge in self.edges:
+            self.edges.remove(edge)
+
+    def delete(self, node):
+        for src in list(node.incoming):
+            for edge in list(self.edges):
+                if edge.source == src and edge.target == node:
+                    self.remove_edge(edge)
+                    break
+        for dst in list(node.outgoing):
+            for edge in list(self.edges):
+                if edge.source == node and edge.target == dst:
+                    self.remove_edge(edge)
+                    break
+        self.nodes.remove(node)
+
+
+class IndexedStore:
+    """GraphCanvas bookkeeping with EdgeIndex and an ordered node set."""
+
+    def __init__(self):
+        self.nodes = {}
+        self.edges = EdgeIndex()
+
+    def connect(self, source, target):
+        if self.edges.get(source, target) is None:
+            self.edges.add(Edge(source, target))
+
+    def drag(self, node):
+        return self.edges.edges_of(node)
+
+    def remove_edge(self, edge):
+        edge.source.outgoing.remove(edge.target)
+        edge.target.incoming.remove(edge.source)
+        self.edges.remove(edge)
+
+    def delete(self, node):
+        for edge in self.edges.edges_of(node):
+            self.remove_edge(edge)
+        self.nodes.pop(node, None)
+
+
+def build(store, n_nodes, n_edges, rng):
+    nodes = [Node() for _ in range(n_nodes)]
+    for node in nodes:
+        if isinstance(store.nodes, dict):
+            store.nodes[node] = None
+        else:
+            store.nodes.append(node)
+    pairs = set()
+    while len(pairs) < n_edges:
+        a, b = rng.sample(range(n_nodes), 2)
+        pairs.add((a, b))
+    start = time.perf_counter()
+    for a, b in pairs:
+        store.connect(nodes[a], nodes[b])
+    connect = (time.perf_counter() - start) / n_edges
+    return nodes, connect
+
+
+def measure(store, n_nodes=10_000, n_edges=10_000, samples=200, seed=0):
+    rng = random.Random(seed)
+    nodes, connect = build(store, n_nodes, n_edges, rng)
+    picks = rng.sample(nodes, samples)
+
+    start = time.perf_counter()
+    for node in picks:
+        store.drag(node)
+    drag = (time.perf_counter() - start) / samples
+
+    start = time.perf_counter()
+    for node in picks:
+        store.delete(node)
+    delete = (time.perf_counter() - start) / samples
+    return connect, drag, delete
+
+
+def main():
+    print(f"{'store':<10}{'connect us':>12}{'drag us':>12}{'delete us':>12}")
+    for name, store in (("list", ListStore()), ("indexed", IndexedStore())):
+        connect, drag, delete = measure(store)
+        print(f"{name:<10}{connect * 1e6:>12.1f}{drag * 1e6:>12.1f}{delete * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare ChangeDetector, and the compact TileSummary baseline, against the
+original astype(int) implementation of has_region_changed on 1080p-sized
+frames.
+
+    python -m benchmarks.bench_change_detection
+"""
+import timeit
+
+import numpy as np
+
+from pymacro.backend.observer import ChangeDetector, TileSummary, has_region_changed
+
+HEIGHT, WIDTH = 1080, 1920
+
+
+def legacy_has_region_changed(prev, curr, threshold=10):
+    diff = np.abs(prev.astype(int) - curr.astype(int))
+    changed_pixels = np.sum(diff > 20)
+    return changed_pixels > threshold
+
+
+def make_frames(kind, rng):
+    prev = rng.integers(0, 256, size=(HEIGHT, WIDTH, 3), dtype=np.uint8)
+    curr = prev.copy()
+    if kind == "changed_top":
+        curr[:40] ^= 0xFF
+    elif kind == "changed_bottom":
+        curr[-40:] ^= 0xFF
+    elif kind == "noise":
+        # Small deltas everywhere, none above the trigger delta
+        curr = np.clip(prev.astype(np.int16) + rng.integers(-10, 11, prev.shape), 0, 255).astype(np.uint8)
+    return prev, curr
+
+
+def bench(fn, prev, curr, number):
+    return min(timeit.repeat(lambda: fn(prev, curr, 10), number=number, repeat=5)) / number
+
+
+def main(number=10):
+    rng = np.random.default_rng(0)
+    detector = ChangeDetector()
+    tiles = TileSummary()
+    print(f"{'case':<16}{'legacy ms':>12}{'detector ms':>14}{'speedup':>10}{'tiles ms':>11}")
+    for kind in ("static", "noise", "changed_top", "changed_bottom"):
+        prev, curr = make_frames(kind, rng)
+        expected = legacy_has_region_changed(prev, curr)
+        assert has_region_changed(prev, curr, 10, detector) == expected, kind
+        legacy = bench(legacy_has_region_changed, prev, curr, number)
+        fast = bench(lambda p, c, t: detector.changed(p, c, t), prev, curr, number)
+        compact = bench(lambda p, c, t: tiles.changed(c), prev, curr, number)
+        print(f"{kind:<16}{legacy * 1e3:>12.2f}{fast * 1e3:>14.2f}{legacy / fast:>9.1f}x{compact * 1e3:>11.2f}")
+    print(f"baseline bytes: frame {prev.nbytes}, tile summary {tiles.nbytes}")
+
+
+if __name__ == "__main__":
+    main()
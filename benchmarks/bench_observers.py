@@ -0,0 +1,262 @@
+"""
+Observer polling on synthetic screens: ticks per second, per-tick latency
+percentiles and peak traced memory for a set of workloads, compared against
+a stored baseline.
+
+    python -m benchmarks.bench_observers                  # compare with the baseline
+    python -m benchmarks.bench_observers --save-baseline  # record a new baseline
+    python -m benchmarks.bench_observers --check          # exit 1 on a regression
+
+Frames are generated in memory and "captured" as views, so the numbers
+cover CaptureCoordinator, RegionObserver and StateMachine overhead, not the
+screen grab itself. Timings depend on the machine: record the baseline on
+the machine you compare on. Memory is traced in a separate, shorter pass,
+since tracemalloc slows allocating code down several times.
+
+Every run also checks which observers triggered (see ``expected_triggers``);
+a wrong outcome is reported, and fails ``--check``, whatever the baseline.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from pymacro.backend.action import KeyPress
+from pymacro.backend.capture import CaptureCoordinator
+from pymacro.backend.graph import LOOP, build_graph
+from pymacro.backend.observer import RegionObserver
+from pymacro.backend.replay import FrameTimeline, Replay
+
+BASELINE = Path(__file__).with_name("baseline_observers.json")
+WIDTH, HEIGHT = 1920, 1080
+# A block that blinks black and white on flicker screens, aligned to 8x8 tiles
+CURSOR = (40, 40, 56, 56)
+MEMORY_TICKS = 10
+# Observers expected to trigger must on at least this fraction of ticks, the others on at most 1 - it
+OUTCOME_RATE = 0.95
+
+
+class Screen:
+    """A synthetic screen that ``step`` changes in place before each tick."""
+
+    def __init__(self, kind, seed=0):
+        self.kind = kind
+        self.rng = np.random.default_rng(seed)
+        self.frame = self.rng.integers(0, 256, size=(HEIGHT, WIDTH, 3), dtype=np.uint8)
+        self.count = 0
+
+    def step(self):
+        self.count += 1
+        if self.kind == "flicker":
+            # A few dozen pixels anywhere on screen toggle each tick, too few to
+            # trigger a region, and the cursor blinks
+            ys = self.rng.integers(0, HEIGHT, 32)
+            xs = self.rng.integers(0, WIDTH, 32)
+            self.frame[ys, xs] ^= 0xFF
+            x1, y1, x2, y2 = CURSOR
+            self.frame[y1:y2, x1:x2] = 255 if self.count % 2 else 0
+        elif self.kind == "animate":
+            # Every value changes, in place so the generator allocates nothing
+            self.frame += 37
+
+    def grab(self, box=None):
+        if box is None:
+            return self.frame
+        x1, y1, x2, y2 = box
+        return self.frame[y1:y2, x1:x2]
+
+
+def grid_regions(count, size):
+    columns = WIDTH // size
+    return [((i % columns) * size, (i // columns) * size, (i % columns + 1) * size, (i // columns + 1) * size)
+            for i in range(count)]
+
+
+# name -> (screen kind, regions)
+WORKLOADS = {
+    "static": ("static", grid_regions(8, 200)),
+    "sparse flicker": ("flicker", grid_regions(8, 200)),
+    "full animation": ("animate", grid_regions(8, 200)),
+    "many small": ("flicker", grid_regions(400, 32)),
+    "few huge": ("flicker", [(0, 0, 1900, 1000), (10, 40, 1910, 1070)]),
+}
+
+
+def expected_triggers(kind, regions) -> np.ndarray:
+    """Which observers should trigger on every tick: none on a static screen, all
+    under full animation, and under flicker those that contain the cursor."""
+    if kind != "flicker":
+        return np.full(len(regions), kind == "animate")
+    x1, y1, x2, y2 = CURSOR
+    return np.array([r[0] <= x1 and r[1] <= y1 and x2 <= r[2] and y2 <= r[3] for r in regions])
+
+
+def check_outcome(kind, regions, triggers, ticks):
+    """A description of the observers that triggered unexpectedly, or None."""
+    rates = triggers / ticks
+    expected = expected_triggers(kind, regions)
+    missed = np.flatnonzero(expected & (rates < OUTCOME_RATE))
+    spurious = np.flatnonzero(~expected & (rates > 1 - OUTCOME_RATE))
+    problems = [f"{label} {indices[:5].tolist()}" for label, indices in
+                (("missed", missed), ("spurious", spurious)) if len(indices)]
+    return "; ".join(problems) or None
+
+
+def percentiles(samples):
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {"p50_ms": p50 * 1e3, "p90_ms": p90 * 1e3, "p99_ms": p99 * 1e3}
+
+
+def poll(kind, regions, compact, ticks, trace=False):
+    """
+    Poll every region for ``ticks`` frames. Returns the per-tick times, how
+    often each observer triggered and, with ``trace``, the peak traced bytes.
+    The first tick only stores baselines and is left out of all three.
+    """
+    screen = Screen(kind)
+    if trace:
+        tracemalloc.start()
+    capture = CaptureCoordinator(grab=screen.grab)
+    observers = [RegionObserver(region, capture=capture, compact=compact) for region in regions]
+    samples = []
+    triggers = np.zeros(len(observers), dtype=np.int64)
+    for tick in range(ticks):
+        screen.step()
+        start = time.perf_counter()
+        capture.tick()
+        fired = [observer.is_triggered() for observer in observers]
+        samples.append(time.perf_counter() - start)
+        if tick:
+            triggers += fired
+    peak = 0
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return samples[1:], triggers, peak
+
+
+def bench_observers(kind, regions, compact, ticks):
+    """Timings (untraced) and peak memory (traced, separately) for one workload; also returns its outcome check."""
+    samples, triggers, _ = poll(kind, regions, compact, ticks)
+    _, _, peak = poll(kind, regions, compact, MEMORY_TICKS, trace=True)
+    # Throughput from the median tick, so one descheduled tick does not move it
+    result = {"ticks_per_s": 1 / np.median(samples), **percentiles(samples), "peak_mb": peak / 2 ** 20}
+    return result, check_outcome(kind, regions, triggers, ticks - 1)
+
+
+def replay_macro(frames, ticks, trace=False):
+    """
+    Replay a watch-and-act macro over ``frames``; returns the Replay and, with
+    ``trace``, the peak bytes traced while it ran (the timeline is not counted).
+    """
+    session = Replay(FrameTimeline.regular(frames, 0.02), delay=0.0, min_interval=0.001, max_interval=0.001)
+    graph = build_graph(
+        labels=["watch", "act"],
+        observers=[RegionObserver((0, 0, 480, 270), capture=session.capture), None],
+        actions=[[], [KeyPress("a")]],
+        flags=[0, LOOP],
+        edges=[(0, 1), (1, 0)],
+    )
+    if trace:
+        tracemalloc.start()
+    session.run(session.machine(graph), until=float("inf"), max_ticks=ticks)
+    peak = 0
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return session, peak
+
+
+def bench_state_machine(ticks):
+    """StateMachine.step/Scheduler overhead: replay a watch-and-act macro on a virtual clock."""
+    screen = Screen("flicker")
+    frames = []
+    for _ in range(50):
+        screen.step()
+        frames.append(screen.frame[:270, :480].copy())
+    session, _ = replay_macro(frames, ticks)
+    _, peak = replay_macro(frames, MEMORY_TICKS * 20, trace=True)
+    # The cursor blinks on every frame, so each new frame should be acted on once
+    changes = session.timeline.index_at(session.clock())
+    presses = len(session.backend.events)
+    problem = None if presses >= OUTCOME_RATE * changes else f"{presses} key presses for {changes} frame changes"
+    return {"ticks_per_s": session.ticks / session.wall_time, "peak_mb": peak / 2 ** 20}, problem
+
+
+def best(runs):
+    """
+    The fastest of repeated ``(result, problem)`` runs: noise from other
+    processes only ever slows a run down. Any run's problem is kept.
+    """
+    problems = [problem for _, problem in runs if problem]
+    return max((result for result, _ in runs), key=lambda result: result["ticks_per_s"]), next(iter(problems), None)
+
+
+def run_all(ticks, repeat):
+    """Returns ``(results, problems)``, both keyed by workload name."""
+    results, problems = {}, {}
+    runs = {}
+    for name, (kind, regions) in WORKLOADS.items():
+        for compact in (False, True):
+            runs[f"{name}{' (compact)' if compact else ''}"] = [
+                bench_observers(kind, regions, compact, ticks) for _ in range(repeat)]
+    runs["state machine"] = [bench_state_machine(ticks * 20) for _ in range(repeat)]
+    for name, attempts in runs.items():
+        results[name], problem = best(attempts)
+        if problem:
+            problems[name] = problem
+    return results, problems
+
+
+def compare(results, baseline, tolerance):
+    """Print results next to the baseline; return the names that regressed by more than ``tolerance``."""
+    regressions = []
+    print(f"{'workload':<26}{'ticks/s':>10}{'vs base':>9}{'p50 ms':>9}{'p99 ms':>9}{'peak MB':>9}{'vs base':>9}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        speed = memory = ""
+        if base:
+            ratio = result["ticks_per_s"] / base["ticks_per_s"]
+            growth = result["peak_mb"] / base["peak_mb"] if base["peak_mb"] else 1.0
+            speed, memory = f"{ratio - 1:+.0%}", f"{growth - 1:+.0%}"
+            if ratio < 1 - tolerance or growth > 1 + tolerance:
+                regressions.append(name)
+        latency = "".join(f"{result[key]:>9.2f}" if key in result else f"{'-':>9}" for key in ("p50_ms", "p99_ms"))
+        print(f"{name:<26}{result['ticks_per_s']:>10.0f}{speed:>9}{latency}{result['peak_mb']:>9.1f}{memory:>9}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per workload; the fastest is kept")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown or memory growth")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if anything regressed")
+    args = parser.parse_args(argv)
+
+    results, problems = run_all(args.ticks, args.repeat)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    regressions = compare(results, baseline, args.tolerance)
+    for name, problem in problems.items():
+        print(f"wrong outcome in {name}: {problem}")
+    if problems:
+        # Never record a baseline from code that gets the answers wrong
+        return 1
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=1, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+    elif regressions:
+        print(f"regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
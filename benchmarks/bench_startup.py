@@ -0,0 +1,48 @@
+"""
+Cold-start time of the headless runner, and a check that it stays free of
+GUI and input libraries until they are needed.
+
+    python -m benchmarks.bench_startup
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("tkinter", "pyautogui", "pynput", "PIL.ImageGrab")
+
+CASES = {
+    "python -c pass": [sys.executable, "-c", "pass"],
+    "import numpy": [sys.executable, "-c", "import numpy"],
+    "import pymacro.cli": [sys.executable, "-c", "import pymacro.cli"],
+    "load runtime modules": [sys.executable, "-c",
+                             "import pymacro.backend.state, pymacro.backend.storage"],
+    "python -m pymacro --help": [sys.executable, "-m", "pymacro", "--help"],
+}
+
+CHECK = (
+    "import sys, pymacro.cli, pymacro.backend.state, pymacro.backend.storage\n"
+    f"loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+    "assert not loaded, f'heavy modules imported at startup: {loaded}'\n"
+)
+
+
+def time_command(command, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), min(samples)
+
+
+def main(runs=15):
+    subprocess.run([sys.executable, "-c", CHECK], check=True)
+    print(f"{'case':<28}{'median ms':>11}{'min ms':>9}")
+    for name, command in CASES.items():
+        median, best = time_command(command, runs)
+        print(f"{name:<28}{median * 1e3:>11.1f}{best * 1e3:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
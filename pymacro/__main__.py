@@ -0,0 +1,5 @@
+import sys
+
+from pymacro.cli import main
+
+sys.exit(main())
@@ -1,10 +1,181 @@
-import pyautogui
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, replace
+from typing import List
+
+import numpy as np
+
+from pymacro.backend.random import jitter, random_delay
+
+
+class InputBackend:
+    """Sends input events to the OS. Subclasses pick the library that does it."""
+
+    def move(self, x, y):
+        raise NotImplementedError
+
+    def down(self, x, y, button):
+        raise NotImplementedError
+
+    def up(self, x, y, button):
+        raise NotImplementedError
+
+    def click(self, x, y, button):
+        self.down(x, y, button)
+        self.up(x, y, button)
+
+    def press(self, key):
+        raise NotImplementedError
+
+    def key_down(self, key):
+        raise NotImplementedError
+
+    def key_up(self, key):
+        raise NotImplementedError
+
+
+# pynput key names, which recordings use, that pyautogui spells differently
+PYAUTOGUI_KEYS = {
+    "alt_l": "altleft",
+    "alt_r": "altright",
+    "alt_gr": "altright",
+    "caps_lock": "capslock",
+    "cmd": "winleft",
+    "cmd_l": "winleft",
+    "cmd_r": "winright",
+    "ctrl_l": "ctrlleft",
+    "ctrl_r": "ctrlright",
+    "media_next": "nexttrack",
+    "media_play_pause": "playpause",
+    "media_previous": "prevtrack",
+    "media_volume_down": "volumedown",
+    "media_volume_mute": "volumemute",
+    "media_volume_up": "volumeup",
+    "num_lock": "numlock",
+    "page_down": "pagedown",
+    "page_up": "pageup",
+    "print_screen": "printscreen",
+    "scroll_lock": "scrolllock",
+    "shift_l": "shiftleft",
+    "shift_r": "shiftright",
+}
+
+
+class PyAutoGUIBackend(InputBackend):
+    """pyautogui without its global PAUSE after every call; the executor owns the timing."""
+
+    def __init__(self):
+        # Imported here: pyautogui is slow to import and needs a display
+        import pyautogui
+        self._gui = pyautogui
+
+    def move(self, x, y):
+        self._gui.moveTo(x, y, _pause=False)
+
+    def down(self, x, y, button):
+        self._gui.mouseDown(x=x, y=y, button=button, _pause=False)
+
+    def up(self, x, y, button):
+        self._gui.mouseUp(x=x, y=y, button=button, _pause=False)
+
+    def click(self, x, y, button):
+        self._gui.click(x=x, y=y, button=button, _pause=False)
+
+    def press(self, key):
+        self._gui.press(PYAUTOGUI_KEYS.get(key, key), _pause=False)
+
+    def key_down(self, key):
+        self._gui.keyDown(PYAUTOGUI_KEYS.get(key, key), _pause=False)
+
+    def key_up(self, key):
+        self._gui.keyUp(PYAUTOGUI_KEYS.get(key, key), _pause=False)
+
+
+class PynputBackend(InputBackend):
+    """Drives the pynput mouse and keyboard controllers directly."""
+
+    def __init__(self):
+        from pynput import keyboard, mouse
+        self._mouse = mouse.Controller()
+        self._keyboard = keyboard.Controller()
+        self._buttons = mouse.Button
+        self._keys = keyboard.Key
+
+    def move(self, x, y):
+        self._mouse.position = (x, y)
+
+    def down(self, x, y, button):
+        self.move(x, y)
+        self._mouse.press(self._buttons[button])
+
+    def up(self, x, y, button):
+        self.move(x, y)
+        self._mouse.release(self._buttons[button])
+
+    def _key(self, key):
+        return getattr(self._keys, key) if len(key) > 1 else key
+
+    def press(self, key):
+        key = self._key(key)
+        self._keyboard.press(key)
+        self._keyboard.release(key)
+
+    def key_down(self, key):
+        self._keyboard.press(self._key(key))
+
+    def key_up(self, key):
+        self._keyboard.release(self._key(key))
+
+
+class DryRunBackend(InputBackend):
+    """Records ``(time, event, args)`` tuples instead of sending input."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.events = []
+
+    def _record(self, event, *args):
+        self.events.append((self.clock(), event, args))
+
+    def move(self, x, y):
+        self._record("move", x, y)
+
+    def down(self, x, y, button):
+        self._record("down", x, y, button)
+
+    def up(self, x, y, button):
+        self._record("up", x, y, button)
+
+    def click(self, x, y, button):
+        self._record("click", x, y, button)
+
+    def press(self, key):
+        self._record("press", key)
+
+    def key_down(self, key):
+        self._record("key_down", key)
+
+    def key_up(self, key):
+        self._record("key_up", key)
+
+
+_default_backend = None
+
+
+def default_backend() -> InputBackend:
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = PyAutoGUIBackend()
+    return _default_backend
+
 
 class Action:
     def execute(self):
         raise NotImplementedError("Subclasses must implement execute()")
 
+    def apply(self, backend: InputBackend):
+        """Perform the action through ``backend``; actions that predate backends just execute()."""
+        self.execute()
+
 @dataclass
 class MouseClick(Action):
     x: int
@@ -12,6 +183,213 @@ class MouseClick(Action):
     button: str = "left"
 
     def execute(self):
-        # Use pyobjc or pyautogui (mac-compatible)
-        pyautogui.click(x=self.x, y=self.y, button=self.button)
+        self.apply(default_backend())
+
+    def apply(self, backend):
+        backend.click(self.x, self.y, self.button)
+
+
+@dataclass
+class MouseMove(Action):
+    x: int
+    y: int
+
+    def execute(self):
+        self.apply(default_backend())
+
+    def apply(self, backend):
+        backend.move(self.x, self.y)
+
+
+@dataclass
+class MouseDown(Action):
+    x: int
+    y: int
+    button: str = "left"
+
+    def execute(self):
+        self.apply(default_backend())
+
+    def apply(self, backend):
+        backend.down(self.x, self.y, self.button)
+
+
+@dataclass
+class MouseUp(Action):
+    x: int
+    y: int
+    button: str = "left"
+
+    def execute(self):
+        self.apply(default_backend())
+
+    def apply(self, backend):
+        backend.up(self.x, self.y, self.button)
+
+
+@dataclass
+class KeyPress(Action):
+    key: str
+
+    def execute(self):
+        self.apply(default_backend())
+
+    def apply(self, backend):
+        backend.press(self.key)
+
+
+@dataclass
+class KeyDown(Action):
+    key: str
+
+    def execute(self):
+        self.apply(default_backend())
+
+    def apply(self, backend):
+        backend.key_down(self.key)
+
+
+@dataclass
+class KeyUp(Action):
+    key: str
+
+    def execute(self):
+        self.apply(default_backend())
+
+    def apply(self, backend):
+        backend.key_up(self.key)
+
+
+@dataclass
+class Plan:
+    """A timed schedule: ``actions[i]`` is due ``times[i]`` seconds after the batch starts."""
+    times: np.ndarray
+    actions: List[Action]
+    # True where the action is one of the originals (not a generated move)
+    original: np.ndarray
+
+    def __len__(self):
+        return len(self.actions)
+
+
+class Batch:
+    """
+    One scheduled run of a Plan, stepped by the caller: while not ``done``,
+    check interrupts if ``interruptible``, wait ``remaining()`` seconds, then
+    ``fire()``. ActionExecutor.run does this with blocking sleeps; AsyncRunner
+    awaits instead, so both keep the same pace.
+    """
+
+    def __init__(self, executor, plan: Plan, node=None):
+        self.executor = executor
+        self.node = node
+        self.actions = plan.actions
+        self.times = plan.times.tolist()
+        self.original = plan.original.tolist()
+        self.start = executor.clock()
+        if executor.ready is not None:
+            self.start = max(self.start, executor.ready)
+        self.next = 0
+        executor.lateness = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.next >= len(self.actions)
+
+    @property
+    def interruptible(self) -> bool:
+        """Interrupts are checked before each original action but the first, not every pointer step."""
+        return self.next > 0 and self.original[self.next]
+
+    def remaining(self) -> float:
+        """Seconds until the next action is due; an overdue original action counts towards ``lateness``."""
+        late = self.executor.clock() - self.start - self.times[self.next]
+        if late >= 0 and self.original[self.next]:
+            self.executor.lateness = max(self.executor.lateness, late)
+        return -late
+
+    def fire(self):
+        executor = self.executor
+        executor._apply(self.actions[self.next], self.node)
+        executor.ready = executor.clock() + executor.delay
+        self.next += 1
+
+
+class ActionExecutor:
+    """
+    Runs a list of actions as one batch through an InputBackend.
+
+    Action ``i`` is scheduled ``i * delay`` seconds after the batch starts,
+    so the sequence keeps its requested pace however long each call takes.
+    A batch starts no sooner than ``delay`` after the previous batch's last
+    action, which paces a looping node that repeats straight away.
+    With ``humanize`` the delays vary by ``random_delay`` and positions are
+    moved by ``jitter`` from ``backend/random.py``. With a ``motion`` engine
+    (see ``backend/motion.py``) the batch follows its plan instead, and the
+    pointer travels to each target along a generated path.
+    """
+
+    def __init__(self, backend=None, delay=0.1, humanize=False,
+                 clock=time.perf_counter, sleep=time.sleep, metrics=None, motion=None):
+        self.backend = backend
+        self.delay = delay
+        self.humanize = humanize
+        self.clock = clock
+        self.sleep = sleep
+        self.metrics = metrics
+        self.motion = motion
+        self.position = None  # where the last positioned action left the pointer
+        self.lateness = 0.0  # worst lag behind schedule in the last batch
+        self.ready = None  # earliest start of the next batch
+
+    def perform(self, action: Action, node=None):
+        self._apply(self._jittered(action), node)
+
+    def _jittered(self, action):
+        if self.humanize and hasattr(action, "x"):
+            x, y = jitter((action.x, action.y))
+            return replace(action, x=x, y=y)
+        return action
+
+    def _apply(self, action, node=None):
+        backend = self.backend if self.backend is not None else default_backend()
+        if self.metrics is None:
+            action.apply(backend)
+        else:
+            start = self.metrics.clock()
+            action.apply(backend)
+            self.metrics.observe("action", node, self.metrics.clock() - start)
+        if hasattr(action, "x"):
+            self.position = (action.x, action.y)
+
+    def schedule(self, actions) -> Plan:
+        """
+        Plan ``actions``: the motion engine's plan if there is one, else
+        action ``i`` at ``i * delay`` (varied and jittered with ``humanize``).
+        """
+        if self.motion is not None:
+            return self.motion.plan(actions, self.position, self.delay)
+        n = len(actions)
+        gaps = random_delay(self.delay, n) if self.humanize else np.full(n, float(self.delay))
+        gaps[:1] = 0.0
+        return Plan(np.cumsum(gaps), [self._jittered(a) for a in actions], np.ones(n, dtype=bool))
+
+    def batch(self, actions, node=None) -> Batch:
+        """Start a Batch for ``actions``; its schedule begins now, or ``delay`` after the last action."""
+        return Batch(self, self.schedule(actions), node)
 
+    def run(self, actions, interrupt=None, node=None) -> bool:
+        """
+        Run ``actions`` in order. ``interrupt`` is called between actions;
+        returning True abandons the rest of the batch, and run() returns False.
+        ``node`` labels the actions' timings when metrics are enabled.
+        """
+        batch = self.batch(actions, node)
+        while not batch.done:
+            if batch.interruptible and interrupt is not None and interrupt():
+                return False
+            remaining = batch.remaining()
+            if remaining > 0:
+                self.sleep(remaining)
+            batch.fire()
+        return True
@@ -0,0 +1,141 @@
+import threading
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from pymacro.backend.observer import grab_box_region
+
+Box = Tuple[int, int, int, int]
+
+
+def box_area(box: Box) -> int:
+    x1, y1, x2, y2 = box
+    return max(0, x2 - x1) * max(0, y2 - y1)
+
+
+def box_union(a: Box, b: Box) -> Box:
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def boxes_overlap(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def box_contains(outer: Box, inner: Box) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def plan_grabs(regions: List[Box], merge_ratio: float = 1.5) -> List[Box]:
+    """
+    Group regions into the boxes that should be grabbed each tick.
+
+    Two groups are merged when they overlap, or when their union covers no
+    more than ``merge_ratio`` times the area the regions themselves need.
+    Nearby regions therefore share one grab, while regions on opposite
+    corners of the screen keep separate, smaller grabs.
+    """
+    groups = [(box, box_area(box)) for box in dict.fromkeys(regions)]
+    merged = True
+    while merged and len(groups) > 1:
+        merged = False
+        for i in range(len(groups)):
+            for j in range(i + 1, len(groups)):
+                (a, area_a), (b, area_b) = groups[i], groups[j]
+                union = box_union(a, b)
+                if boxes_overlap(a, b) or box_area(union) <= merge_ratio * (area_a + area_b):
+                    groups[i] = (union, area_a + area_b)
+                    del groups[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [box for box, _ in groups]
+
+
+class CaptureCoordinator:
+    """
+    Shares screen grabs between observers. Each grab box is captured at most
+    once per tick, and observers receive zero-copy views sliced from it.
+    Call ``tick()`` at the start of every poll to invalidate the last frames.
+
+    With ``full_screen`` one frame is grabbed per tick, ``grab(None)``, whose
+    top-left corner is at screen position ``origin``. ``fresh``, if given, is
+    asked before every view of it; when it returns False the frame may soon
+    be overwritten (a CaptureWorker ring slot) and is grabbed again.
+    """
+
+    def __init__(self, grab: Callable[[Optional[Box]], np.ndarray] = grab_box_region,
+                 merge_ratio: float = 1.5, full_screen: bool = False, metrics=None,
+                 fresh: Optional[Callable[[], bool]] = None, origin: Tuple[int, int] = (0, 0)):
+        self.grab = grab
+        self.merge_ratio = merge_ratio
+        self.full_screen = full_screen
+        self.origin = tuple(map(int, origin))
+        self.metrics = metrics
+        self.fresh = fresh
+        # Observers evaluated in parallel must not grab the same box twice
+        self._lock = threading.Lock()
+        self.regions: List[Box] = []
+        self._plan: Optional[List[Box]] = None
+        self._frames = {}
+        self.generation = 0
+
+    def register(self, region):
+        region = tuple(map(int, region))
+        if region not in self.regions:
+            self.regions.append(region)
+            self._plan = None
+
+    def unregister(self, region):
+        region = tuple(map(int, region))
+        if region in self.regions:
+            self.regions.remove(region)
+            self._plan = None
+
+    @property
+    def plan(self) -> List[Box]:
+        if self._plan is None:
+            self._plan = plan_grabs(self.regions, self.merge_ratio)
+            self._frames.clear()
+        return self._plan
+
+    def tick(self):
+        self._frames.clear()
+        self.generation += 1
+
+    def release(self):
+        """Drop the frames of the current tick, e.g. before the memory they view is closed."""
+        self._frames.clear()
+
+    def _grab(self, box):
+        if self.metrics is None:
+            self._frames[box] = self.grab(box)
+        else:
+            start = self.metrics.clock()
+            self._frames[box] = self.grab(box)
+            self.metrics.observe("capture", None, self.metrics.clock() - start)
+
+    def _needs_grab(self) -> bool:
+        return None not in self._frames or (self.fresh is not None and not self.fresh())
+
+    def _frame_for(self, region: Box):
+        if self.full_screen:
+            if self._needs_grab():
+                with self._lock:
+                    if self._needs_grab():
+                        self._grab(None)
+            return self.origin, self._frames[None]
+        for box in self.plan:
+            if box_contains(box, region):
+                if box not in self._frames:
+                    with self._lock:
+                        if box not in self._frames:
+                            self._grab(box)
+                return box[:2], self._frames[box]
+        raise KeyError(f"Region {region} is not registered with this coordinator")
+
+    def view(self, region) -> np.ndarray:
+        """Return a view of ``region`` from the current tick's frame, grabbing it if needed."""
+        x1, y1, x2, y2 = region = tuple(map(int, region))
+        (ox, oy), frame = self._frame_for(region)
+        return frame[y1 - oy:y2 - oy, x1 - ox:x2 - ox]
@@ -0,0 +1,173 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from pymacro.backend.action import Action
+from pymacro.backend.observer import Observer, RegionObserver
+
+HALT = -1
+
+# Node flags
+LOOP = 1
+INTERRUPT = 2
+
+
+@dataclass
+class RuntimeGraph:
+    """
+    Flat, index-based form of a macro graph.
+
+    Node ``i`` waits on ``observers[i]`` (or fires immediately when it is
+    None), runs ``actions[i]`` and moves on to ``next_index[i]``. Edges are
+    stored CSR-style: the successors of ``i`` are
+    ``targets[offsets[i]:offsets[i + 1]]``. Interrupt nodes are listed in
+    ``interrupts`` from highest to lowest priority.
+
+    A node with several successors branches: the machine then waits on all
+    of them at once, and ``branches[i]`` lists them from highest to lowest
+    priority. ``next_index[i]`` is the first of them.
+    """
+    labels: List[str]
+    observers: List[Optional[Observer]]
+    actions: List[List[Action]]
+    flags: np.ndarray
+    offsets: np.ndarray
+    targets: np.ndarray
+    start: int = 0
+    priorities: Optional[np.ndarray] = None
+    next_index: np.ndarray = field(init=False, repr=False)
+    interrupts: np.ndarray = field(init=False, repr=False)
+    branches: Dict[int, np.ndarray] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        n = len(self.labels)
+        if self.priorities is None:
+            self.priorities = np.zeros(n, dtype=np.int16)
+        self.branches = {}
+        for i in np.flatnonzero(np.diff(self.offsets) > 1).tolist():
+            self.branches[i] = self.by_priority(self.successors(i))
+        first = np.full(n, HALT, dtype=np.int32)
+        has_edges = self.offsets[1:] > self.offsets[:-1]
+        first[has_edges] = self.targets[self.offsets[:-1][has_edges]]
+        for i, candidates in self.branches.items():
+            first[i] = candidates[0]
+        # A looping node with nowhere else to go repeats itself
+        looping = ~has_edges & (self.flags & LOOP).astype(bool)
+        first[looping] = np.flatnonzero(looping)
+        self.next_index = first
+        self.interrupts = self.by_priority(np.flatnonzero(self.flags & INTERRUPT))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def successors(self, index: int) -> np.ndarray:
+        return self.targets[self.offsets[index]:self.offsets[index + 1]]
+
+    def by_priority(self, indices) -> np.ndarray:
+        """``indices`` from highest to lowest priority; ties keep their order."""
+        indices = np.asarray(indices)
+        order = np.argsort(-self.priorities[indices].astype(np.int32), kind="stable")
+        return indices[order]
+
+
+def build_graph(labels, observers, actions, flags, edges, start=0, priorities=None) -> RuntimeGraph:
+    """Build a RuntimeGraph from per-node lists and ``(source, target)`` index pairs."""
+    n = len(labels)
+    edges = np.asarray(edges, dtype=np.int32).reshape(-1, 2)
+    # Stable sort keeps each node's successors in insertion order
+    edges = edges[np.argsort(edges[:, 0], kind="stable")]
+    offsets = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(edges[:, 0], minlength=n), out=offsets[1:])
+    return RuntimeGraph(
+        labels=list(labels),
+        observers=list(observers),
+        actions=[list(a) for a in actions],
+        flags=np.asarray(flags, dtype=np.uint8),
+        offsets=offsets,
+        targets=np.ascontiguousarray(edges[:, 1]),
+        start=start,
+        priorities=None if priorities is None else np.asarray(priorities, dtype=np.int16),
+    )
+
+
+def _following(node) -> list:
+    following = [node.next_node] if node.next_node is not None else []
+    return following + list(getattr(node, "branches", ()))
+
+
+def compile_nodes(start) -> RuntimeGraph:
+    """Compile backend GraphNodes reachable from ``start`` through ``next_node`` and ``branches``."""
+    index = {}
+    order = []
+    pending = [start]
+    while pending:
+        node = pending.pop(0)
+        if node is None or id(node) in index:
+            continue
+        index[id(node)] = len(order)
+        order.append(node)
+        pending.extend(_following(node))
+    edges = [(i, index[id(target)]) for i, node in enumerate(order) for target in _following(node)]
+    return build_graph(
+        labels=[str(i) for i in range(len(order))],
+        observers=[node.observer for node in order],
+        actions=[node.actions for node in order],
+        flags=np.zeros(len(order), dtype=np.uint8),
+        edges=edges,
+        priorities=[getattr(node, "priority", 0) for node in order],
+    )
+
+
+def region_observer(node) -> Observer:
+    if node.bbox is None:
+        raise ValueError(f"Observer node {node.label!r} has no region")
+    return RegionObserver(region=tuple(node.bbox))
+
+
+def entry_index(nodes, flags, edges) -> int:
+    """Index of the first non-interrupt Observer node without incoming edges, else 0."""
+    targeted = {t for _, t in edges}
+    entries = [i for i, node in enumerate(nodes)
+               if node.type == "Observer" and not flags[i] & INTERRUPT and i not in targeted]
+    return entries[0] if entries else 0
+
+
+def compile_canvas(nodes, start=None, make_observer: Callable = region_observer) -> RuntimeGraph:
+    """
+    Compile canvas nodes into a RuntimeGraph.
+
+    ``nodes`` only need the NodeWidget data attributes (``label``, ``type``,
+    ``outgoing``, ``bbox``/``interrupt`` or ``actions``/``loop``, and
+    optionally an interrupt ``priority``), so any
+    plain object works and Tk is not required. Observer nodes become waiting
+    nodes built by ``make_observer``; Action nodes fire immediately. Unless
+    ``start`` is given, the machine starts at the first non-interrupt
+    Observer without incoming edges.
+    """
+    nodes = list(nodes)
+    if not nodes:
+        raise ValueError("Cannot compile an empty graph")
+    index = {id(node): i for i, node in enumerate(nodes)}
+    observers, actions, flags, priorities = [], [], [], []
+    for node in nodes:
+        priorities.append(getattr(node, "priority", 0))
+        if node.type == "Observer":
+            observers.append(make_observer(node))
+            actions.append([])
+            flags.append(INTERRUPT if node.interrupt else 0)
+        else:
+            for action in node.actions:
+                if not isinstance(action, Action):
+                    raise TypeError(f"Action node {node.label!r} holds a non-Action entry: {action!r}")
+            observers.append(None)
+            actions.append(node.actions)
+            flags.append(LOOP if node.loop else 0)
+    edges = [(index[id(node)], index[id(target)]) for node in nodes for target in node.outgoing]
+
+    if start is None:
+        start_index = entry_index(nodes, flags, edges)
+    else:
+        start_index = index[id(start)]
+    return build_graph([node.label for node in nodes], observers, actions, flags, edges,
+                       start_index, priorities)
@@ -0,0 +1,259 @@
+"""
+Runtime instrumentation.
+
+Pass a ``Metrics`` to StateMachine (or CaptureCoordinator, ActionExecutor,
+RegionObserver) to record latency histograms per stage and node, plus
+trigger, interrupt and overrun counters. Everything defaults to
+``metrics=None``, which costs one ``is None`` check per stage.
+
+Stages: ``capture`` (screen grab), ``diff`` (region comparison),
+``observer`` (one is_triggered call), ``action`` (one action), ``tick``
+(one StateMachine step), ``sleep`` and ``overrun`` (scheduler waits).
+"""
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+# 10 us to ~10 s, doubling
+DEFAULT_BUCKETS = tuple(1e-5 * 2 ** i for i in range(21))
+
+Key = Tuple[str, Optional[str]]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; ``observe`` is a bisect and two additions."""
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q) -> float:
+        """Upper bound of the bucket holding quantile ``q``."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": list(zip(self.bounds, self.counts)) + [("+Inf", self.counts[-1])],
+        }
+
+
+class Metrics:
+    """
+    Latency histograms keyed by ``(stage, node)`` and counters keyed by
+    ``(name, node)``. Recording is thread-safe: branch observers report
+    from the StateMachine's worker threads.
+    """
+
+    def __init__(self, clock=time.perf_counter, buckets=DEFAULT_BUCKETS):
+        self.clock = clock
+        self.buckets = buckets
+        self.histograms: Dict[Key, Histogram] = {}
+        self.counters: Dict[Key, int] = {}
+        self.started = time.time()
+        self.profiler: Optional["SamplingProfiler"] = None
+        self.profiled_node = None
+        self._lock = threading.Lock()
+
+    def observe(self, stage, node, seconds):
+        key = (stage, node)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count(self, name, node=None, n=1):
+        key = (name, node)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+    def instrument(self, graph=None, capture=None, executor=None):
+        """Point a graph's observers, a CaptureCoordinator and an ActionExecutor at these metrics."""
+        for target in list(graph.observers if graph is not None else ()) + [capture, executor]:
+            if target is not None and hasattr(target, "metrics"):
+                target.metrics = self
+
+    def profile(self, node, interval=0.005):
+        """Sample the call stack while ``node`` (a node label) is being stepped."""
+        if self.profiler is not None:
+            self.profiler.stop()
+        self.profiler = SamplingProfiler(interval)
+        self.profiled_node = node
+        self.profiler.start()
+        return self.profiler
+
+    def snapshot(self) -> dict:
+        # list() first: the running machine may add keys while we read
+        return {
+            "started": self.started,
+            "time": time.time(),
+            "histograms": [dict(stage=stage, node=node, **h.snapshot())
+                           for (stage, node), h in list(self.histograms.items())],
+            "counters": [dict(name=name, node=node, value=value)
+                         for (name, node), value in list(self.counters.items())],
+        }
+
+    def to_json(self, indent=None) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix="pymacro") -> str:
+        lines = []
+        histograms = sorted(self.histograms.items(), key=lambda item: (item[0][0], item[0][1] or ""))
+        if histograms:
+            name = f"{prefix}_stage_seconds"
+            lines += [f"# HELP {name} Latency of each runtime stage, per node.", f"# TYPE {name} histogram"]
+            for (stage, node), h in histograms:
+                labels = _labels(stage=stage, node=node)
+                cumulative = 0
+                for bound, n in zip(h.bounds, h.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"{name}_sum{{{labels}}} {h.sum:.9g}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+        for counter in sorted({name for name, _ in self.counters}):
+            name = f"{prefix}_{counter}_total"
+            lines.append(f"# TYPE {name} counter")
+            for (key, node), value in sorted(self.counters.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+                if key == counter:
+                    labels = _labels(node=node)
+                    lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write a snapshot atomically: Prometheus text for ``.prom``/``.txt`` paths, JSON otherwise."""
+        text = self.to_prometheus() if str(path).endswith((".prom", ".txt")) else self.to_json(indent=1)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+def _labels(**labels) -> str:
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items() if value is not None)
+
+
+class Exporter:
+    """Writes ``metrics`` to ``path`` every ``interval`` seconds from a daemon thread, and once more on stop()."""
+
+    def __init__(self, metrics: Metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="pymacro-metrics", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.metrics.write(self.path)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.metrics.write(self.path)
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of whichever thread last called ``resume()`` every
+    ``interval`` seconds, until ``pause()``. StateMachine resumes it around
+    steps of the profiled node, and AsyncRunner around that node's work on
+    its thread pool, so only that node's time is sampled.
+    """
+
+    def __init__(self, interval=0.005, depth=32):
+        self.interval = interval
+        self.depth = depth
+        self.samples = Counter()
+        self.active = False
+        self.thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="pymacro-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def resume(self):
+        self.thread_id = threading.get_ident()
+        self.active = True
+
+    def pause(self):
+        self.active = False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.active:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.depth:
+                code = frame.f_code
+                stack.append(f"{code.co_filename}:{frame.f_lineno} {code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(stack)] += 1
+
+    def top(self, limit=10, cumulative=False):
+        """Most sampled functions: innermost frames only, or every frame on the stack with ``cumulative``."""
+        counts = Counter()
+        for stack, n in self.samples.items():
+            for entry in (set(stack) if cumulative else stack[:1]):
+                counts[entry] += n
+        return counts.most_common(limit)
+
+    def report(self, limit=10) -> str:
+        total = sum(self.samples.values())
+        lines = [f"{total} samples every {self.interval * 1e3:g} ms"]
+        for entry, n in self.top(limit):
+            lines.append(f"{n / total:7.1%}  {entry}" if total else entry)
+        return "\n".join(lines)
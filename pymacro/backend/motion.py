@@ -0,0 +1,162 @@
+"""
+Human-like mouse motion.
+
+``MotionEngine.plan`` turns a list of actions into a timed schedule in
+which every positioned action is preceded by a curved pointer path. Each
+path is a cubic Bezier with random bends, traversed on a minimum-jerk
+speed profile and lasting as long as Fitts' law predicts. All the paths
+and delays for a batch come from a few vectorized calls on one seedable
+Generator. Plans are cached per action sequence and starting point: a
+looping node pays for generation only for its first ``variants``
+iterations and then reuses those schedules.
+"""
+from dataclasses import replace
+from typing import Optional, Tuple
+
+import numpy as np
+
+from pymacro.backend.action import MouseMove, Plan
+from pymacro.backend.random import DELAY_VARIATION, JITTER_RADIUS, generator
+
+
+def minimum_jerk(n) -> np.ndarray:
+    """Progress (0 to 1) at ``n`` evenly spaced times along a minimum-jerk movement."""
+    t = np.linspace(0.0, 1.0, n)
+    return t ** 3 * (10 - 15 * t + 6 * t * t)
+
+
+def bezier(control, s) -> np.ndarray:
+    """Points of cubic Bezier curves. ``control`` is (..., 4, 2), ``s`` is (n,); returns (..., n, 2)."""
+    s = s[:, None]
+    u = 1 - s
+    p0, p1, p2, p3 = (control[..., i, None, :] for i in range(4))
+    return u ** 3 * p0 + 3 * u * u * s * p1 + 3 * u * s * s * p2 + s ** 3 * p3
+
+
+class MotionEngine:
+    """
+    Plans pointer paths and action timings.
+
+    ``rate`` is the number of pointer updates per second along a path,
+    ``bend`` the largest sideways offset of the Bezier control points as a
+    fraction of the distance, and ``fitts`` the ``(a, b)`` of the movement
+    time ``a + b * log2(distance / width + 1)`` in seconds.
+    """
+
+    def __init__(self, rng=None, rate=100, bend=0.3, fitts=(0.1, 0.1), width=20,
+                 radius=JITTER_RADIUS, variation=DELAY_VARIATION, variants=4, cache_size=256):
+        self.rng = generator(rng)
+        self.rate = rate
+        self.bend = bend
+        self.fitts = fitts
+        self.width = width
+        self.radius = radius
+        self.variation = variation
+        self.variants = variants
+        self.cache_size = cache_size
+        self._cache = {}
+        # Jittered end of a built plan -> the un-jittered target it aimed at
+        self._anchors = {}
+
+    def durations(self, distances) -> np.ndarray:
+        a, b = self.fitts
+        return np.where(distances > 0, a + b * np.log2(distances / self.width + 1), 0.0)
+
+    def paths(self, starts, ends):
+        """
+        Pointer paths from each start to each end, both (m, 2). Returns
+        ``(points, durations)``: points is (m, n, 2) with the end last,
+        durations is (m,). n is set by the longest path; shorter paths simply
+        take smaller steps.
+        """
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        chord = ends - starts
+        distance = np.hypot(chord[:, 0], chord[:, 1])
+        durations = self.durations(distance)
+        n = max(int(np.ceil(durations.max(initial=0.0) * self.rate)), 2)
+        normal = np.stack([-chord[:, 1], chord[:, 0]], axis=1)
+        # Control points a third and two thirds along, pushed sideways and a little along the chord
+        offsets = self.rng.uniform(-self.bend, self.bend, size=(len(starts), 2, 2))
+        control = np.empty((len(starts), 4, 2))
+        control[:, 0], control[:, 3] = starts, ends
+        for k, fraction in enumerate((1 / 3, 2 / 3)):
+            control[:, k + 1] = (starts + fraction * chord + offsets[:, k, :1] * normal
+                                 + 0.2 * offsets[:, k, 1:] * chord)
+        points = bezier(control, minimum_jerk(n))
+        # Small tremor, fading out so the path still ends exactly on target
+        taper = np.sin(np.linspace(0, np.pi, n))[None, :, None]
+        points += self.rng.normal(0.0, 0.5, size=points.shape) * taper
+        return np.rint(points).astype(np.int64), durations
+
+    def plan(self, actions, start: Optional[Tuple[int, int]] = None, delay=0.1) -> Plan:
+        """
+        Schedule ``actions``: positioned ones get a jittered target and a path
+        from the previous pointer position (``start`` for the first, which
+        jumps when ``start`` is None). Gaps between actions vary around ``delay``.
+
+        A ``start`` that is where an earlier plan left the pointer is replaced
+        by that plan's un-jittered target, so the next batch finds the cache
+        whichever variant ran before it. The path then starts up to ``radius``
+        pixels from the pointer.
+        """
+        start = self._anchors.get(start, start)
+        key = (start, delay, tuple((type(a), tuple(vars(a).values())) for a in actions))
+        plans = self._cache.get(key)
+        if plans is not None and len(plans) >= self.variants:
+            return plans[self.rng.integers(len(plans))]
+        plan = self._build(actions, start, delay)
+        if plans is None:
+            if len(self._cache) >= self.cache_size:
+                self._cache.pop(next(iter(self._cache)))
+                if len(self._anchors) > self.cache_size * self.variants:
+                    self._anchors.clear()
+            plans = self._cache[key] = []
+        plans.append(plan)
+        return plan
+
+    def _build(self, actions, start, delay) -> Plan:
+        if not actions:
+            return Plan(np.empty(0), [], np.empty(0, dtype=bool))
+        positioned = [i for i, a in enumerate(actions) if hasattr(a, "x")]
+        targets = np.array([(actions[i].x, actions[i].y) for i in positioned], dtype=np.int64).reshape(-1, 2)
+        if self.radius and len(targets):
+            aimed = tuple(targets[-1].tolist())
+            targets += self.rng.integers(-self.radius, self.radius + 1, size=targets.shape)
+            self._anchors[tuple(targets[-1].tolist())] = aimed
+        # Each path starts where the previous positioned action left the pointer
+        starts = np.empty_like(targets)
+        if len(targets):
+            starts[0] = start if start is not None else targets[0]
+            starts[1:] = targets[:-1]
+        points, durations = self.paths(starts, targets)
+        gaps = delay * (1 + self.rng.uniform(-self.variation, self.variation, size=len(actions)))
+        gaps[0] = 0.0
+
+        times, planned, original = [], [], []
+        path = {i: k for k, i in enumerate(positioned)}
+        now = 0.0
+        for i, action in enumerate(actions):
+            now += gaps[i]
+            k = path.get(i)
+            if k is not None:
+                x, y = int(targets[k, 0]), int(targets[k, 1])
+                steps = points[k, 1:-1]
+                if durations[k] > 0 and len(steps):
+                    # Drop repeated points; a short path needs fewer updates
+                    keep = np.any(np.diff(points[k, :-1], axis=0) != 0, axis=1)
+                    step_times = now + durations[k] * np.arange(1, len(steps) + 1) / (len(steps) + 1)
+                    for (px, py), t in zip(steps[keep].tolist(), step_times[keep].tolist()):
+                        times.append(t)
+                        planned.append(MouseMove(px, py))
+                        original.append(False)
+                    now += durations[k]
+                action = replace(action, x=x, y=y)
+            times.append(now)
+            planned.append(action)
+            original.append(True)
+        return Plan(np.array(times), planned, np.array(original, dtype=bool))
+
+    def clear(self):
+        self._cache.clear()
+        self._anchors.clear()
@@ -1,12 +1,12 @@
-
-from dataclasses import dataclass
-from typing import Tuple, Optional
-from pynput import mouse
-from PIL import ImageGrab
+from dataclasses import dataclass, field
+from typing import Sequence, Tuple, Optional
 import numpy as np
 
+from pymacro.backend.template import Template
+
 def select_screen_region():
     """Let user click and drag to define a rectangular screen region."""
+    from pynput import mouse
     print("[*] Drag to select region...")
 
     positions = []
@@ -26,18 +26,213 @@ def select_screen_region():
     return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
 
 
-def grab_box_region(box):
-    """Return a NumPy array of the screen region."""
+def grab_box_region(box=None):
+    """Return a NumPy array of the screen region, or of the full screen if ``box`` is None."""
+    from PIL import ImageGrab
+    if box is None:
+        return np.array(ImageGrab.grab().convert('RGB'))
     x1, y1, x2, y2 = map(int, box)
     img = ImageGrab.grab(bbox=(x1, y1, x2, y2)).convert('RGB')
     return np.array(img)
 
 
-def has_region_changed(prev, curr, threshold=10):
+class ChangeDetector:
+    """
+    Counts changed pixel values between two uint8 frames without per-call
+    allocations. Frames are compared in blocks of rows and the scan stops as
+    soon as more than ``threshold`` values have changed.
+    """
+
+    def __init__(self, delta=20, block_rows=32):
+        self.delta = delta
+        self.block_rows = block_rows
+        self._hi = None
+        self._lo = None
+        self._mask = None
+
+    def _buffers(self, rows, row_shape):
+        shape = (rows,) + row_shape
+        if self._hi is None or self._hi.shape != shape:
+            self._hi = np.empty(shape, dtype=np.uint8)
+            self._lo = np.empty(shape, dtype=np.uint8)
+            self._mask = np.empty(shape, dtype=bool)
+        return self._hi, self._lo, self._mask
+
+    def count(self, prev, curr, limit=None):
+        """Return the number of changed values, stopping once ``limit`` is exceeded."""
+        if prev.shape != curr.shape:
+            raise ValueError(f"Frame shapes differ: {prev.shape} != {curr.shape}")
+        rows = prev.shape[0]
+        block = min(self.block_rows, rows) or 1
+        hi, lo, mask = self._buffers(block, prev.shape[1:])
+        total = 0
+        for start in range(0, rows, block):
+            stop = min(start + block, rows)
+            n = stop - start
+            a, b = prev[start:stop], curr[start:stop]
+            # |a - b| in uint8 as max(a, b) - min(a, b): no widening, no wraparound
+            np.maximum(a, b, out=hi[:n])
+            np.minimum(a, b, out=lo[:n])
+            np.subtract(hi[:n], lo[:n], out=hi[:n])
+            np.greater(hi[:n], self.delta, out=mask[:n])
+            total += np.count_nonzero(mask[:n])
+            if limit is not None and total > limit:
+                break
+        return total
+
+    def changed(self, prev, curr, threshold=10):
+        return bool(self.count(prev, curr, limit=threshold) > threshold)
+
+
+def _block_sums(a, size, axis, dtype=np.uint32):
+    """Sum ``a`` over groups of ``size`` along ``axis``; a shorter last group is kept.
+    Splitting one axis is always a view, so strided region views are not copied."""
+    n = a.shape[axis]
+    full = n // size * size
+    parts = []
+    if full:
+        blocks = a[(slice(None),) * axis + (slice(0, full),)]
+        shape = a.shape[:axis] + (n // size, size) + a.shape[axis + 1:]
+        parts.append(blocks.reshape(shape).sum(axis=axis + 1, dtype=dtype))
+    if full < n:
+        rest = a[(slice(None),) * axis + (slice(full, None),)]
+        parts.append(rest.sum(axis=axis, dtype=dtype, keepdims=True))
+    return parts[0] if len(parts) == 1 else np.concatenate(parts, axis=axis)
+
+
+def _row_group_sums(a, size) -> np.ndarray:
+    """Sum groups of ``size`` along the rows of 2-D ``a``; a shorter last group is kept.
+    A float32 matrix-vector product with ones is several times faster than
+    sum() over a short inner axis, and exact while sums stay below 2 ** 24."""
+    rows, n = a.shape
+    full = n // size * size
+    groups = np.empty((rows, full), dtype=np.float32)
+    np.copyto(groups, a[:, :full], casting="unsafe")
+    sums = (groups.reshape(-1, size) @ np.ones(size, dtype=np.float32)).reshape(rows, -1)
+    if full < n:
+        sums = np.concatenate([sums, a[:, full:].sum(axis=1, keepdims=True, dtype=np.float32)], axis=1)
+    return sums
+
+
+class TileSummary:
+    """
+    Compact change detection: keeps one byte per ``tile`` x ``tile`` block,
+    the mean of every ``stride``-th row of it (all columns and channels),
+    plus the raw pixels of the tile rows that changed on the last call.
+
+    Counts are in values changed by more than ``delta``, as with
+    ChangeDetector. Only tile rows where some tile's mean moved are compared
+    pixel by pixel, against their raw pixels when these were kept. A tile row
+    that was quiet until now has no raw pixels, so its count is estimated
+    from the means: a value moves its tile's sum by at most 255, so at least
+    ``moved * values / 255`` of a tile's values changed. A first change can
+    therefore be undercounted, and one that leaves every mean as it was
+    goes unseen.
+
+    Summaries are computed ``band`` tile rows at a time, which bounds the
+    scratch memory; every band is summarized on every call, so the baseline
+    is always the previous frame.
+    """
+
+    def __init__(self, tile=8, delta=20, stride=2, band=16):
+        if tile % stride:
+            raise ValueError(f"tile ({tile}) must be a multiple of stride ({stride})")
+        self.tile = tile
+        self.delta = delta
+        self.stride = stride
+        self.band = band
+        self.detector = ChangeDetector(delta)
+        self.means = None
+        self.pixels = {}  # tile row -> raw pixel rows of a tile row that changed
+        self._shape = None
+        self._scale = None
+        self._values = None  # values per tile
+
+    @property
+    def nbytes(self) -> int:
+        means = self.means.nbytes if self.means is not None else 0
+        return means + sum(rows.nbytes for rows in self.pixels.values())
+
+    def _summarize(self, rows, scale) -> np.ndarray:
+        """Tile means of ``rows``, flattened pixel rows starting on a tile boundary."""
+        # Sampled rows first; columns then only see one row of sums per tile row.
+        # A tile's values are tile * channels consecutive entries of a flattened row.
+        per_tile = self.tile // self.stride
+        narrow = np.uint16 if per_tile * 255 <= np.iinfo(np.uint16).max else np.uint32
+        sampled = _block_sums(rows[::self.stride], per_tile, axis=0, dtype=narrow)
+        channels = rows.shape[1] // self._shape[1]
+        sums = _row_group_sums(sampled, self.tile * channels)
+        # Multiplying by 1 / area instead of dividing; truncation may round an exact mean down by one
+        return (sums * scale).astype(np.uint8)
+
+    def summarize(self, frame) -> np.ndarray:
+        self._prepare(frame)
+        rows = frame.reshape(frame.shape[0], -1)
+        step = self.tile * self.band
+        return np.concatenate([self._summarize(rows[start:start + step], self._scale[start // self.tile:][:self.band])
+                               for start in range(0, frame.shape[0], step)])
+
+    def _prepare(self, frame):
+        if self._shape == frame.shape:
+            return
+        h, w = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        self._shape = frame.shape
+        # Sampled rows per tile row times values per tile column
+        heights = np.minimum(self.tile, h - np.arange(0, h, self.tile))
+        widths = np.minimum(self.tile, w - np.arange(0, w, self.tile)) * channels
+        self._scale = (1.0 / np.outer(-(-heights // self.stride), widths)).astype(np.float32)
+        self._values = np.outer(heights, widths)
+        self.means = None
+        self.pixels = {}
+
+    def count(self, frame, limit=None) -> int:
+        """
+        Changed values between the stored baseline and ``frame``, which then
+        becomes the baseline; counting stops once more than ``limit`` have changed.
+        """
+        means = self.summarize(frame)
+        if self.means is None:
+            self.means = means
+            return 0
+        moved = np.maximum(self.means, means) - np.minimum(self.means, means)
+        self.means = means
+        rows = frame.reshape(frame.shape[0], -1)
+        pixels = {}
+        changed = 0
+        for r in np.flatnonzero(moved.any(axis=1)).tolist():
+            current = rows[r * self.tile:(r + 1) * self.tile]
+            kept = self.pixels.get(r)
+            if limit is None or changed <= limit:
+                if kept is not None:
+                    changed += self.detector.count(kept, current, None if limit is None else limit - changed)
+                else:
+                    changed += int(np.dot(moved[r], self._values[r])) // 255
+            # Keep the pixels of this tile row for the next call, reusing its buffer
+            if kept is None:
+                kept = current.copy()
+            else:
+                np.copyto(kept, current)
+            pixels[r] = kept
+        self.pixels = pixels
+        return changed
+
+    def changed(self, frame, threshold=10) -> bool:
+        """Whether more than ``threshold`` values changed."""
+        return bool(self.count(frame, limit=threshold) > threshold)
+
+
+def has_region_changed(prev, curr, threshold=10, detector=None):
     """Check if the image has changed enough to be considered a trigger."""
-    diff = np.abs(prev.astype(int) - curr.astype(int))
-    changed_pixels = np.sum(diff > 20)
-    return changed_pixels > threshold
+    detector = detector if detector is not None else ChangeDetector()
+    return detector.changed(prev, curr, threshold)
+
+
+def grab_observed_region(region, capture=None):
+    """Return the region from the shared capture if there is one, else grab it directly."""
+    if capture is not None:
+        return capture.view(region)
+    return grab_box_region(region)
 
 
 class Observer:
@@ -49,14 +244,153 @@ class RegionObserver(Observer):
     region: Tuple[int, int, int, int]
     threshold: int = 10
     last_state: Optional[np.ndarray] = None
+    detector: ChangeDetector = field(default_factory=ChangeDetector, repr=False)
+    capture: Optional["CaptureCoordinator"] = field(default=None, repr=False)
+    # Compact mode keeps a TileSummary instead of last_state
+    compact: bool = False
+    tile: int = 8
+    summary: Optional[TileSummary] = field(default=None, repr=False)
+    metrics: Optional["Metrics"] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.capture is not None:
+            self.capture.register(self.region)
+        if self.compact and self.summary is None:
+            self.summary = TileSummary(self.tile, self.detector.delta)
+            if self.last_state is not None:
+                self.summary.count(self.last_state)
+                self.last_state = None
+
+    def grab(self) -> np.ndarray:
+        return grab_observed_region(self.region, self.capture)
 
     def is_triggered(self) -> bool:
-        current = grab_box_region(self.region)
+        metrics = self.metrics
+        if metrics is None:
+            return self.compare(self.grab())
+        start = metrics.clock()
+        current = self.grab()
+        if self.capture is None:  # a shared capture times its own grabs
+            metrics.observe("capture", None, metrics.clock() - start)
+        start = metrics.clock()
+        changed = self.compare(current)
+        metrics.observe("diff", None, metrics.clock() - start)
+        return changed
+
+    def compare(self, current) -> bool:
+        """Compare ``current`` against the baseline, which it then replaces."""
+        if self.summary is not None:
+            return self.summary.changed(current, self.threshold)
         if self.last_state is None:
-            self.last_state = current
+            self.keep(current)
             return False
-        changed = has_region_changed(self.last_state, current, self.threshold)
-        self.last_state = current
+        changed = has_region_changed(self.last_state, current, self.threshold, self.detector)
+        self.keep(current)
         return changed
 
+    def keep(self, current):
+        """Store ``current`` as the baseline. It may be a view of a frame that will be
+        reused (e.g. a shared-memory ring slot), so it is copied into our own buffer."""
+        last = self.last_state
+        if last is None or last.shape != current.shape or not last.flags.writeable:
+            self.last_state = current.copy()
+        else:
+            np.copyto(last, current)
+
+
+@dataclass
+class ImageObserver(Observer):
+    """Triggers while a reference image is visible inside ``region``."""
+    region: Tuple[int, int, int, int]
+    template: Template
+    threshold: float = 0.9
+    capture: Optional["CaptureCoordinator"] = field(default=None, repr=False)
+    last_match: Optional[Tuple[float, Tuple[int, int]]] = None
+
+    def __post_init__(self):
+        if not isinstance(self.template, Template):
+            self.template = Template(np.asarray(self.template))
+        if self.capture is not None:
+            self.capture.register(self.region)
+
+    def is_triggered(self) -> bool:
+        score, (x, y) = self.template.match(grab_observed_region(self.region, self.capture))
+        # Report the match position in screen coordinates
+        self.last_match = (score, (self.region[0] + x, self.region[1] + y))
+        return score >= self.threshold
+
 
+class ProbeBatch:
+    """
+    Reads every registered pixel probe with one capture and one gather.
+
+    Probes from all PixelProbeObservers sharing a batch are stored in flat
+    arrays. With a CaptureCoordinator the results are computed once per tick
+    from a view of the shared frame. Without one they are computed once per
+    ``tick()``; a batch that is never ticked grabs afresh on every call.
+    """
+
+    def __init__(self, capture=None):
+        self.capture = capture
+        self.xs = np.empty(0, dtype=np.int32)
+        self.ys = np.empty(0, dtype=np.int32)
+        self.colors = np.empty((0, 3), dtype=np.int16)
+        self.tolerances = np.empty(0, dtype=np.int16)
+        self.box = None
+        self._hits = None
+        self._generation = None
+        self._ticks = None  # counts tick() calls, for batches without a coordinator
+
+    def tick(self):
+        """Start a new tick: the next ``hits()`` grabs again and the calls after it reuse that grab."""
+        self._ticks = (self._ticks or 0) + 1
+
+    def add(self, points, colors, tolerance) -> slice:
+        """Register probes and return the slice of ``hits()`` that belongs to them."""
+        points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+        colors = np.asarray(colors, dtype=np.int16).reshape(-1, 3)
+        if len(points) != len(colors):
+            raise ValueError("Expected one colour per probe point")
+        start = len(self.xs)
+        self.xs = np.concatenate([self.xs, points[:, 0]])
+        self.ys = np.concatenate([self.ys, points[:, 1]])
+        self.colors = np.concatenate([self.colors, colors])
+        self.tolerances = np.concatenate([self.tolerances, np.broadcast_to(np.int16(tolerance), len(points))])
+
+        box = (int(self.xs.min()), int(self.ys.min()), int(self.xs.max()) + 1, int(self.ys.max()) + 1)
+        if self.capture is not None and box != self.box:
+            if self.box is not None:
+                self.capture.unregister(self.box)
+            self.capture.register(box)
+        self.box = box
+        self._generation = None
+        return slice(start, len(self.xs))
+
+    def hits(self) -> np.ndarray:
+        """Boolean array: whether each probe is within tolerance of its colour."""
+        generation = self._ticks if self.capture is None else getattr(self.capture, "generation", None)
+        if self._hits is None or generation is None or generation != self._generation:
+            frame = grab_observed_region(self.box, self.capture)
+            pixels = frame[self.ys - self.box[1], self.xs - self.box[0], :3].astype(np.int16)
+            self._hits = np.abs(pixels - self.colors).max(axis=1) <= self.tolerances
+            self._generation = generation
+        return self._hits
+
+
+@dataclass
+class PixelProbeObserver(Observer):
+    """Triggers when the sampled pixels match their colours (all of them, or any with ``match_all=False``)."""
+    points: Sequence[Tuple[int, int]]
+    colors: Sequence[Tuple[int, int, int]]
+    tolerance: int = 16
+    match_all: bool = True
+    batch: Optional[ProbeBatch] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.batch is None:
+            self.batch = ProbeBatch()
+        self._probes = self.batch.add(self.points, self.colors, self.tolerance)
+
+    def is_triggered(self) -> bool:
+        hits = self.batch.hits()[self._probes]
+        return bool(hits.all() if self.match_all else hits.any())
@@ -1,21 +1,39 @@
-import random
+import numpy as np
 
 # GLOBALS
 # ----------------
 JITTER_RADIUS = 3
 DELAY_VARIATION = 0.05
 
-def jitter(pos, radius=JITTER_RADIUS):
-    if not pos:
+_rng = np.random.default_rng()
+
+
+def seed(value=None):
+    """Reseed the module generator, for reproducible runs."""
+    global _rng
+    _rng = np.random.default_rng(value)
+
+
+def generator(rng=None) -> np.random.Generator:
+    """``rng`` if given (a Generator or a seed), else the module generator."""
+    if rng is None:
+        return _rng
+    return rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+
+
+def jitter(pos, radius=JITTER_RADIUS, rng=None):
+    """Offset a point, or every row of an (n, 2) array, by up to ``radius`` pixels per axis."""
+    if pos is None or len(pos) == 0:
         return None
-    x, y = pos
-    return (
-        x + random.randint(-radius, radius),
-        y + random.randint(-radius, radius)
-    )
+    points = np.asarray(pos)
+    moved = points + generator(rng).integers(-radius, radius + 1, size=points.shape)
+    if points.ndim == 1:
+        return int(moved[0]), int(moved[1])
+    return moved
 
 
-def random_delay(base):
+def random_delay(base, size=None, rng=None):
+    """``base`` varied uniformly by DELAY_VARIATION; an array of ``size`` delays if given."""
     delta = base * DELAY_VARIATION
-    return random.uniform(base - delta, base + delta)
-
+    delays = generator(rng).uniform(base - delta, base + delta, size)
+    return float(delays) if size is None else delays
@@ -0,0 +1,221 @@
+import threading
+import time
+
+import numpy as np
+
+from pymacro.backend.action import KeyDown, KeyPress, KeyUp, MouseClick, MouseDown, MouseMove, MouseUp
+
+# Event types
+MOVE = 0
+PRESS = 1
+RELEASE = 2
+KEY = 3  # key down
+KEY_UP = 4
+MOUSE_EVENTS = (MOVE, PRESS, RELEASE)
+
+EVENT_DTYPE = np.dtype([
+    ("t", np.float64),
+    ("type", np.uint8),
+    ("x", np.int32),
+    ("y", np.int32),
+    ("button", np.uint32),  # mouse button index, or key code for KEY and KEY_UP events
+])
+
+BUTTONS = ["left", "right", "middle"]
+# Key codes below this are unicode code points; above it they index EventBuffer.keys
+SPECIAL_KEY_BASE = 0x110000
+
+CLICK_DISTANCE = 3
+
+
+class EventBuffer:
+    """Preallocated ring buffer of input events; the oldest are overwritten when full."""
+
+    def __init__(self, capacity=65536):
+        self.data = np.zeros(capacity, dtype=EVENT_DTYPE)
+        self.keys = []
+        self.count = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, len(self.data))
+
+    def append(self, t, type, x=0, y=0, button=0):
+        with self._lock:
+            capacity = len(self.data)
+            if self.count >= capacity:
+                self.dropped += 1
+            self.data[self.count % capacity] = (t, type, x, y, button)
+            self.count += 1
+
+    def key_code(self, name):
+        """Return the code stored for a named (non-character) key."""
+        if name not in self.keys:
+            self.keys.append(name)
+        return SPECIAL_KEY_BASE + self.keys.index(name)
+
+    def key_name(self, code):
+        code = int(code)
+        return chr(code) if code < SPECIAL_KEY_BASE else self.keys[code - SPECIAL_KEY_BASE]
+
+    def events(self):
+        """Return the buffered events in chronological order."""
+        with self._lock:
+            capacity = len(self.data)
+            if self.count <= capacity:
+                return self.data[:self.count].copy()
+            start = self.count % capacity
+            return np.concatenate([self.data[start:], self.data[:start]])
+
+    def clear(self):
+        with self._lock:
+            self.count = 0
+            self.dropped = 0
+
+
+def simplify_path(points, epsilon):
+    """Ramer-Douglas-Peucker: keep only the points needed to stay within ``epsilon`` pixels of the path."""
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    if n < 3:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        chord = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*chord)
+        if length == 0:
+            dist = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            dist = np.abs(chord[0] * offsets[:, 1] - chord[1] * offsets[:, 0]) / length
+        i = int(np.argmax(dist))
+        if dist[i] > epsilon:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return points[keep]
+
+
+def drop_stop_click(events, box):
+    """
+    Remove the input spent stopping a recording: mouse events inside ``box``
+    (screen bounds of the window holding the Stop button) and the pointer
+    moves after the last other event, which only led there. Keys are kept.
+    """
+    x1, y1, x2, y2 = box
+    inside = (np.isin(events["type"], MOUSE_EVENTS) & (events["x"] >= x1) & (events["x"] < x2)
+              & (events["y"] >= y1) & (events["y"] < y2))
+    events = events[~inside]
+    last = (events["type"] != MOVE).nonzero()[0]
+    return events[:last[-1] + 1] if len(last) else events[:0]
+
+
+def events_to_actions(events, keys=None, epsilon=2.0):
+    """
+    Convert recorded events to Actions. Runs of mouse moves are simplified
+    with Ramer-Douglas-Peucker; a press and release at the same spot with no
+    movement in between becomes a single MouseClick. Likewise a key that goes
+    down and straight back up becomes a KeyPress, while one held over other
+    input (a modifier, say) stays a KeyDown and a KeyUp.
+    """
+    keys = keys if keys is not None else EventBuffer()
+    actions = []
+    moves = []
+    anchored = False
+
+    def flush_moves():
+        if moves:
+            path = simplify_path(moves, epsilon)
+            # The anchor is where the pointer already was; don't move there again
+            for x, y in path[1:] if anchored else path:
+                actions.append(MouseMove(int(round(x)), int(round(y))))
+            moves.clear()
+
+    for event in events:
+        kind, x, y = int(event["type"]), int(event["x"]), int(event["y"])
+        if kind == MOVE:
+            if not moves:
+                last = actions[-1] if actions else None
+                anchored = hasattr(last, "x")
+                if anchored:
+                    moves.append((last.x, last.y))
+            moves.append((x, y))
+            continue
+        flush_moves()
+        if kind == KEY:
+            actions.append(KeyDown(keys.key_name(event["button"])))
+            continue
+        if kind == KEY_UP:
+            key = keys.key_name(event["button"])
+            last = actions[-1] if actions else None
+            if isinstance(last, KeyDown) and last.key == key:
+                actions[-1] = KeyPress(key)
+            else:
+                actions.append(KeyUp(key))
+            continue
+        button = BUTTONS[int(event["button"])]
+        if kind == PRESS:
+            actions.append(MouseDown(x, y, button))
+        elif kind == RELEASE:
+            last = actions[-1] if actions else None
+            if (isinstance(last, MouseDown) and last.button == button
+                    and abs(last.x - x) <= CLICK_DISTANCE and abs(last.y - y) <= CLICK_DISTANCE):
+                actions[-1] = MouseClick(last.x, last.y, button)
+            else:
+                actions.append(MouseUp(x, y, button))
+    flush_moves()
+    return actions
+
+
+class Recorder:
+    """Records mouse and keyboard input with pynput into an EventBuffer."""
+
+    def __init__(self, capacity=65536, clock=time.monotonic):
+        self.buffer = EventBuffer(capacity)
+        self.clock = clock
+        self._listeners = []
+
+    def on_move(self, x, y):
+        self.buffer.append(self.clock(), MOVE, x, y)
+
+    def on_click(self, x, y, button, pressed):
+        name = getattr(button, "name", str(button))
+        index = BUTTONS.index(name) if name in BUTTONS else 0
+        self.buffer.append(self.clock(), PRESS if pressed else RELEASE, x, y, index)
+
+    def _key_code(self, key):
+        char = getattr(key, "char", None)
+        return ord(char) if char else self.buffer.key_code(getattr(key, "name", str(key)))
+
+    def on_press(self, key):
+        self.buffer.append(self.clock(), KEY, button=self._key_code(key))
+
+    def on_release(self, key):
+        self.buffer.append(self.clock(), KEY_UP, button=self._key_code(key))
+
+    def start(self):
+        from pynput import keyboard, mouse
+        self.buffer.clear()
+        self._listeners = [
+            mouse.Listener(on_move=self.on_move, on_click=self.on_click),
+            keyboard.Listener(on_press=self.on_press, on_release=self.on_release),
+        ]
+        for listener in self._listeners:
+            listener.start()
+
+    def stop(self):
+        for listener in self._listeners:
+            listener.stop()
+        self._listeners = []
+        return self.buffer.events()
+
+    def actions(self, events=None, epsilon=2.0):
+        events = self.buffer.events() if events is None else events
+        return events_to_actions(events, self.buffer, epsilon)
@@ -0,0 +1,152 @@
+"""
+Faster-than-real-time macro replay.
+
+A ``Replay`` runs a StateMachine against a ``FrameTimeline`` instead of the
+screen. Time comes from a ``VirtualClock`` that sleeps by jumping forward,
+and actions go to a DryRunBackend stamped with virtual time. An hour-long
+session therefore costs only the observer and action work, with no display.
+"""
+import time
+from typing import Optional
+
+import numpy as np
+
+from pymacro.backend.action import ActionExecutor, DryRunBackend
+from pymacro.backend.capture import CaptureCoordinator
+from pymacro.backend.graph import RuntimeGraph
+from pymacro.backend.observer import ProbeBatch
+from pymacro.backend.scheduler import Scheduler
+from pymacro.backend.state import StateMachine
+from pymacro.backend.storage import MacroFile
+
+
+class VirtualClock:
+    """A clock that only moves when something sleeps on it."""
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+
+class FrameTimeline:
+    """Full-screen frames with the times they appear at; each one stays on screen until the next."""
+
+    def __init__(self, frames, times):
+        self.frames = np.asarray(frames)
+        self.times = np.asarray(times, dtype=np.float64)
+        if len(self.frames) == 0 or len(self.frames) != len(self.times):
+            raise ValueError("Expected one time per frame and at least one frame")
+        if np.any(np.diff(self.times) < 0):
+            raise ValueError("Frame times must be sorted")
+
+    @classmethod
+    def regular(cls, frames, interval):
+        return cls(frames, np.arange(len(frames)) * interval)
+
+    @classmethod
+    def from_source(cls, source, count, interval, box=None):
+        """Sample ``count`` frames from a frame source such as SyntheticSource."""
+        return cls.regular(np.stack([np.asarray(source(box)) for _ in range(count)]), interval)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["frames"], data["times"])
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, frames=self.frames, times=self.times)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def start(self) -> float:
+        return float(self.times[0])
+
+    @property
+    def end(self) -> float:
+        """When the last frame leaves the screen: one average frame interval after it appears."""
+        if len(self.times) < 2:
+            return float(self.times[-1])
+        return float(self.times[-1] + (self.times[-1] - self.times[0]) / (len(self.times) - 1))
+
+    def index_at(self, t) -> int:
+        return max(int(np.searchsorted(self.times, t, side="right")) - 1, 0)
+
+    def frame_at(self, t) -> np.ndarray:
+        return self.frames[self.index_at(t)]
+
+
+class Replay:
+    """
+    Virtual clock, frame source and recording action sink for one replay.
+
+    Observers must read the screen through ``capture`` (or a ProbeBatch on
+    it), so load macros with ``load()`` or build them with ``replay.capture``.
+    The scheduler and executor share the virtual clock; ``backend.events``
+    holds every action with the virtual time it was performed at.
+    """
+
+    def __init__(self, timeline: FrameTimeline, delay=0.1, humanize=False,
+                 min_interval=0.02, max_interval=0.25, motion=None):
+        self.timeline = timeline
+        self.clock = VirtualClock(timeline.start)
+        self.capture = CaptureCoordinator(grab=self.grab, full_screen=True)
+        self.probes = ProbeBatch(self.capture)
+        self.backend = DryRunBackend(clock=self.clock)
+        self.scheduler = Scheduler(min_interval, max_interval, clock=self.clock, sleep=self.clock.sleep)
+        self.executor = ActionExecutor(self.backend, delay, humanize, clock=self.clock, sleep=self.clock.sleep,
+                                       motion=motion)
+        self.ticks = 0
+        self.wall_time = 0.0
+
+    def grab(self, box=None) -> np.ndarray:
+        frame = self.timeline.frame_at(self.clock())
+        if box is None:
+            return frame
+        x1, y1, x2, y2 = map(int, box)
+        return frame[y1:y2, x1:x2]
+
+    def load(self, path) -> RuntimeGraph:
+        return MacroFile(path).graph(capture=self.capture, probes=self.probes)
+
+    def machine(self, graph: RuntimeGraph, metrics=None) -> StateMachine:
+        return StateMachine(graph, capture=self.capture, scheduler=self.scheduler, executor=self.executor,
+                            metrics=metrics)
+
+    def run(self, machine: StateMachine, until: Optional[float] = None, max_ticks: Optional[int] = None) -> StateMachine:
+        """
+        Step ``machine`` until it halts, the virtual clock passes ``until``
+        (the end of the timeline by default) or ``max_ticks`` ticks have run.
+        Every tick advances the clock by at least the scheduler's ``min_interval``.
+        """
+        end = self.timeline.end if until is None else until
+        started = time.perf_counter()
+        machine.running = True
+        while machine.running and not machine.halted and self.clock() < end:
+            if max_ticks is not None and self.ticks >= max_ticks:
+                break
+            index = machine.index
+            before = self.clock()
+            machine.wait(index, machine.step())
+            if self.clock() <= before:
+                # Nothing slept (say a looping node with no delay), so move time on
+                # ourselves; otherwise the clock would never reach ``end``
+                self.clock.sleep(self.scheduler.min_interval)
+            self.ticks += 1
+        machine.running = False
+        self.wall_time += time.perf_counter() - started
+        return machine
+
+    @property
+    def speedup(self) -> float:
+        """Virtual seconds simulated per wall-clock second."""
+        elapsed = self.clock() - self.timeline.start
+        return elapsed / self.wall_time if self.wall_time > 0 else float("inf")
@@ -0,0 +1,66 @@
+import time
+from collections import deque
+
+
+class Scheduler:
+    """
+    Deadline-based poll scheduler with a per-node adaptive interval.
+
+    Each node starts at ``min_interval``. Every tick that does not trigger
+    multiplies its interval by ``backoff`` up to ``max_interval``. A trigger
+    resets it, so polling speeds up again right after a change. Ticks are
+    paced against absolute deadlines rather than a fixed sleep, and the time
+    each tick ran past its deadline is kept in ``overruns``.
+    """
+
+    def __init__(self, min_interval=0.02, max_interval=0.25, backoff=1.5,
+                 clock=time.monotonic, sleep=time.sleep, history=256):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("Expected 0 < min_interval <= max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.clock = clock
+        self.sleep = sleep
+        self.intervals = {}
+        self.deadline = None
+        self.overruns = deque(maxlen=history)
+
+    def interval(self, key):
+        return self.intervals.get(key, self.min_interval)
+
+    def reset(self, key=None):
+        """Forget the backoff for ``key``, or for every node if ``key`` is None."""
+        if key is None:
+            self.intervals.clear()
+        else:
+            self.intervals.pop(key, None)
+
+    def advance(self, key, triggered):
+        """Record the outcome of a tick for ``key`` and return the delay until the next one."""
+        now = self.clock()
+        if triggered:
+            # Poll again straight away; the time spent on actions is not an overrun.
+            self.reset(key)
+            self.deadline = now
+            return 0.0
+        interval = self.interval(key)
+        self.intervals[key] = min(interval * self.backoff, self.max_interval)
+        if self.deadline is None:
+            self.deadline = now
+        self.deadline += interval
+        overrun = max(0.0, now - self.deadline)
+        self.overruns.append(overrun)
+        if overrun:
+            # Skip the missed ticks instead of bursting to catch up.
+            self.deadline = now
+        return self.deadline - now
+
+    def wait(self, key, triggered):
+        delay = self.advance(key, triggered)
+        if delay > 0:
+            self.sleep(delay)
+
+    @property
+    def last_overrun(self):
+        return self.overruns[-1] if self.overruns else 0.0
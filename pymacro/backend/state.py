@@ -1,9 +1,15 @@
-import time
-from dataclasses import dataclass
-from typing import List, Optional
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
 
-from pymacro.backend.observer import Observer
-from pymacro.backend.action import Action
+from pymacro.backend.observer import Observer, PixelProbeObserver
+from pymacro.backend.action import Action, ActionExecutor
+from pymacro.backend.capture import CaptureCoordinator
+from pymacro.backend.graph import HALT, RuntimeGraph, compile_nodes
+from pymacro.backend.metrics import Metrics
+from pymacro.backend.scheduler import Scheduler
 
 
 @dataclass
@@ -11,25 +17,365 @@ class GraphNode:
     observer: Observer
     actions: List[Action]
     next_node: Optional['GraphNode'] = None
+    # Alternatives to next_node; the machine waits on all of them and follows the winner
+    branches: List['GraphNode'] = field(default_factory=list)
+    priority: int = 0
 
 
 
+BRANCH_MODES = ("priority", "first")
+
+
 class StateMachine:
-    def __init__(self, start_node: GraphNode):
-        self.current = start_node
+    """
+    Steps a RuntimeGraph. When a node has several successors, their
+    observers are evaluated together each tick on a pool of ``workers``
+    threads, against the same capture; the machine follows the
+    highest-priority one that triggered, or with ``branch_mode="first"``
+    whichever reported a trigger first.
+    """
+
+    def __init__(self, start: Union[GraphNode, RuntimeGraph], capture: Optional[CaptureCoordinator] = None,
+                 scheduler: Optional[Scheduler] = None, executor: Optional[ActionExecutor] = None,
+                 metrics: Optional[Metrics] = None, workers=4, branch_mode="priority"):
+        if branch_mode not in BRANCH_MODES:
+            raise ValueError(f"branch_mode must be one of {BRANCH_MODES}")
+        self.graph = start if isinstance(start, RuntimeGraph) else compile_nodes(start)
+        self.index = self.graph.start
+        # Candidates being waited on after a branching node, or None
+        self.branch = None
+        self.workers = workers
+        self.branch_mode = branch_mode
+        self._pool = None
+        self.capture = capture
+        # Probe batches with no coordinator to tick are ticked by the machine, so they grab once per tick
+        self._probes = list({id(o.batch): o.batch for o in self.graph.observers
+                             if isinstance(o, PixelProbeObserver) and o.batch.capture is None}.values())
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        self.executor = executor if executor is not None else ActionExecutor()
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.instrument(self.graph, capture, self.executor)
         self.running = False
+        self.tick_started = None
+        # Seconds from the capture that revealed an interrupt to the jump it caused
+        self.preempt_latencies = deque(maxlen=256)
+        # Interrupts that fired and have not yet seen their condition clear
+        self._fired = set()
+
+    @property
+    def halted(self) -> bool:
+        return self.index == HALT
+
+    @property
+    def label(self):
+        return self.graph.labels[self.index] if not self.halted else None
+
+    def _timed(self, i):
+        """``(triggered, seconds)`` for observer ``i``; seconds is None without metrics."""
+        observer = self.graph.observers[i]
+        if self.metrics is None:
+            return observer.is_triggered(), None
+        start = self.metrics.clock()
+        triggered = observer.is_triggered()
+        return triggered, self.metrics.clock() - start
+
+    def _record(self, i, elapsed):
+        if elapsed is not None:
+            self.metrics.observe("observer", self.graph.labels[i], elapsed)
+
+    def _evaluate(self, i) -> bool:
+        triggered, elapsed = self._timed(i)
+        self._record(i, elapsed)
+        return triggered
+
+    def begin_tick(self):
+        """Invalidate shared frames so every observer checked from here on sees one new capture."""
+        if self.capture is not None:
+            self.capture.tick()
+        for probes in self._probes:
+            probes.tick()
+        self.tick_started = self.scheduler.clock()
+
+    def check_interrupts(self) -> bool:
+        """
+        Evaluate interrupt observers by priority and jump to the target of the
+        first that triggers. An interrupt fires once per change: observers such
+        as ImageObserver stay triggered while their condition holds, so one that
+        fired is re-armed only after it has reported False.
+        """
+        for i in self.graph.interrupts.tolist():
+            if i == self.index:
+                continue
+            triggered = self._evaluate(i)
+            if i in self._fired:
+                if not triggered:
+                    self._fired.discard(i)
+                continue
+            if triggered:
+                self._fired.add(i)
+                self._leave(i)
+                self.preempt_latencies.append(self.scheduler.clock() - self.tick_started)
+                if self.metrics is not None:
+                    self.metrics.count("interrupts", self.graph.labels[i])
+                return True
+        return False
+
+    def _interrupted(self) -> bool:
+        self.begin_tick()
+        return self.check_interrupts()
+
+    def poll(self) -> bool:
+        """Check the current node's observer once, or every candidate of a branch."""
+        if self.branch is not None:
+            winner = self._choose(self.branch)
+            if winner is None:
+                return False
+            self.index, self.branch = winner, None
+            return True
+        if self.graph.observers[self.index] is None:
+            return True
+        return self._evaluate(self.index)
+
+    def _choose(self, candidates) -> Optional[int]:
+        """The branch candidate to follow this tick, or None if none triggered."""
+        observers = self.graph.observers
+        fallback = None
+        for k, i in enumerate(candidates.tolist()):
+            if observers[i] is None:
+                # Fires unconditionally: it wins at once, or beats everything ranked below it
+                if k == 0 or self.branch_mode == "first":
+                    return i
+                candidates, fallback = candidates[:k], i
+                break
+        if self.workers <= 1 or len(candidates) == 1:
+            for i in candidates.tolist():
+                if self._evaluate(i):
+                    return i
+            return fallback
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pymacro-branch")
+        futures = {self._pool.submit(self._timed, i): i for i in candidates.tolist()}
+        winner = None
+        if self.branch_mode == "first":
+            for future in as_completed(futures):
+                triggered, elapsed = future.result()
+                self._record(futures[future], elapsed)
+                if triggered and winner is None:
+                    winner = futures[future]
+        else:
+            # Dicts keep insertion order, which is priority order here
+            for future, i in futures.items():
+                triggered, elapsed = future.result()
+                self._record(i, elapsed)
+                if triggered and winner is None:
+                    winner = i
+        return winner if winner is not None else fallback
+
+    def _leave(self, i):
+        """Move on from node ``i``: to its successor, or to waiting on all of its branches."""
+        self.branch = self.graph.branches.get(i)
+        self.index = int(self.graph.next_index[i])
+
+    def advance(self):
+        self._leave(self.index)
+
+    def step(self) -> bool:
+        """
+        Run one tick: interrupts first, then the current node. Interrupts are
+        checked again, on a fresh capture, between the node's actions.
+        """
+        metrics = self.metrics
+        if metrics is None:
+            return self._step()
+        label = self.label
+        start = metrics.clock()
+        triggered = self.profiled(self._step, label)()
+        self.record_tick(label, start, triggered)
+        return triggered
+
+    def profiled(self, fn, label):
+        """``fn``, sampled by the profiler while it runs if ``label`` is the profiled node."""
+        metrics = self.metrics
+        if metrics is None or metrics.profiled_node != label:
+            return fn
+        profiler = metrics.profiler
+
+        def call(*args):
+            # Resumed here, so the profiler samples whichever thread runs fn
+            profiler.resume()
+            try:
+                return fn(*args)
+            finally:
+                profiler.pause()
+        return call
+
+    def record_tick(self, label, start, triggered):
+        """Record a tick of node ``label`` that began at ``start`` on the metrics clock."""
+        metrics = self.metrics
+        metrics.observe("tick", label, metrics.clock() - start)
+        metrics.count("ticks", label)
+        if triggered:
+            metrics.count("triggers", label)
+
+    def _step(self) -> bool:
+        self.begin_tick()
+        if self.check_interrupts():
+            return True
+        if not self.poll():
+            return False
+        interrupt = self._interrupted if len(self.graph.interrupts) else None
+        if self.executor.run(self.graph.actions[self.index], interrupt, self.label):
+            self.advance()
+        return True
 
     def run(self):
         self.running = True
-        while self.running and self.current:
-            if self.current.observer.is_triggered():
-                for action in self.current.actions:
-                    action.execute()
-                self.current = self.current.next_node
-            else:
-                time.sleep(0.1)
+        try:
+            while self.running and not self.halted:
+                index = self.index
+                self.wait(index, self.step())
+        finally:
+            self.close()
+
+    def close(self):
+        """Shut down the branch thread pool; it is recreated if the machine runs again."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def pace(self, index, triggered) -> float:
+        """Scheduler.advance for a tick of node ``index``, recording any overrun; returns the delay."""
+        delay = self.scheduler.advance(index, triggered)
+        metrics = self.metrics
+        overrun = 0.0 if triggered or metrics is None else self.scheduler.last_overrun
+        if overrun > 0:
+            label = self.graph.labels[index]
+            metrics.observe("overrun", label, overrun)
+            metrics.count("overruns", label)
+        return delay
+
+    def wait(self, index, triggered):
+        """Sleep until the tick after one of node ``index``, as Scheduler.wait does, with metrics."""
+        delay = self.pace(index, triggered)
+        metrics = self.metrics
+        if metrics is None:
+            if delay > 0:
+                self.scheduler.sleep(delay)
+            return
+        start = metrics.clock()
+        if delay > 0:
+            self.scheduler.sleep(delay)
+        metrics.observe("sleep", None, metrics.clock() - start)
 
     def stop(self):
         self.running = False
 
 
+
+
+class AsyncRunner:
+    """
+    Drives many StateMachines on one asyncio event loop.
+
+    Observer polls and action executions block, so they run on a bounded
+    thread pool. Each machine has at most one job in flight and yields to the
+    loop between jobs; the pool queue is FIFO, so a slow observer only delays
+    its own machine and the others keep taking turns on the free workers.
+    """
+
+    def __init__(self, machines=(), max_workers=8):
+        self.machines: List[StateMachine] = list(machines)
+        self.max_workers = max_workers
+        self.running = False
+        self._loop = None
+        self._tasks = []
+
+    def add(self, machine: StateMachine):
+        self.machines.append(machine)
+        if self.running and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._spawn, machine)
+
+    def _spawn(self, machine):
+        self._tasks.append(self._loop.create_task(self._drive(machine)))
+
+    async def _drive(self, machine: StateMachine):
+        machine.running = True
+        metrics = machine.metrics
+        while self.running and machine.running and not machine.halted:
+            index, label = machine.index, machine.label
+            start = metrics.clock() if metrics is not None else None
+            triggered = await self._tick(machine, label)
+            if triggered is None:
+                return
+            if metrics is not None:
+                machine.record_tick(label, start, triggered)
+            delay = machine.pace(index, triggered)
+            # Always yield, even with no delay, so other machines get a turn
+            if metrics is None:
+                await asyncio.sleep(delay)
+            else:
+                start = metrics.clock()
+                await asyncio.sleep(delay)
+                metrics.observe("sleep", None, metrics.clock() - start)
+        machine.running = False
+
+    async def _tick(self, machine: StateMachine, label) -> Optional[bool]:
+        """StateMachine.step with its waits awaited; None if the machine was stopped mid-batch."""
+        def call(fn):
+            # Blocking work runs on the pool, under the profiler when this is the profiled node
+            return self._loop.run_in_executor(self._executor, machine.profiled(fn, label))
+
+        interrupts = len(machine.graph.interrupts)
+        machine.begin_tick()
+        if interrupts and await call(machine.check_interrupts):
+            return True
+        if not await call(machine.poll):
+            return False
+        # poll() may have picked a branch, so read the node again.
+        # The batch keeps the executor's schedule; we await its waits.
+        batch = machine.executor.batch(machine.graph.actions[machine.index], machine.label)
+        while not batch.done:
+            if not (self.running and machine.running):
+                return None
+            if batch.interruptible and interrupts:
+                machine.begin_tick()
+                if await call(machine.check_interrupts):
+                    return True
+            remaining = batch.remaining()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+            await call(batch.fire)
+        machine.advance()
+        return True
+
+    async def run(self):
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._tasks = []
+        try:
+            for machine in self.machines:
+                self._spawn(machine)
+            while any(not task.done() for task in self._tasks):
+                await asyncio.wait([task for task in self._tasks if not task.done()])
+            for task in self._tasks:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            self.running = False
+            for task in self._tasks:
+                task.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        """Stop every machine; safe to call from any thread."""
+        self.running = False
+        for machine in self.machines:
+            machine.stop()
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._cancel)
+
+    def _cancel(self):
+        for task in self._tasks:
+            task.cancel()
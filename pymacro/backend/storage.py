@@ -0,0 +1,305 @@
+"""
+Binary macro files.
+
+A macro is stored as two files:
+
+- ``name.pymacro``: an uncompressed ``.npz`` of small structured arrays
+  (node table, labels, edges, action table, payload index).
+- ``name.pymacro.bin``: a sidecar holding large payloads such as reference
+  images and baseline frames back to back. It is memory-mapped on first use,
+  so opening a file never reads the images themselves.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from pymacro.backend.action import KeyDown, KeyPress, KeyUp, MouseClick, MouseDown, MouseMove, MouseUp
+from pymacro.backend.graph import INTERRUPT, LOOP, RuntimeGraph, build_graph, entry_index
+from pymacro.backend.observer import ImageObserver, PixelProbeObserver, ProbeBatch, RegionObserver
+from pymacro.backend.recorder import BUTTONS
+
+VERSION = 2
+SIDECAR_SUFFIX = ".bin"
+ALIGNMENT = 64
+
+# Node kinds
+OBSERVER_NODE = 0
+ACTION_NODE = 1
+
+# Observer kinds
+NO_OBSERVER = 0
+REGION = 1
+IMAGE = 2
+PROBE = 3
+
+NODE_DTYPE = np.dtype([
+    ("kind", np.uint8),
+    ("flags", np.uint8),
+    ("priority", np.int16),
+    ("x", np.float32),
+    ("y", np.float32),
+    ("bbox", np.int32, (4,)),     # only meaningful with has_bbox
+    ("has_bbox", np.bool_),
+    ("observer", np.uint8),
+    ("threshold", np.float32),
+    ("tolerance", np.int16),
+    ("match_all", np.bool_),
+    ("payload", np.int32),        # row of the payload table, or -1
+    ("actions", np.int32, (2,)),  # [start, stop) rows of the action table
+])
+
+ACTION_KINDS = [MouseClick, MouseMove, MouseDown, MouseUp, KeyPress, KeyDown, KeyUp]
+
+ACTION_DTYPE = np.dtype([
+    ("kind", np.uint8),
+    ("x", np.int32),
+    ("y", np.int32),
+    ("button", np.uint8),
+    ("key", "U24"),
+])
+
+PAYLOAD_DTYPE = np.dtype([
+    ("offset", np.int64),
+    ("dtype", "U8"),
+    ("ndim", np.uint8),
+    ("shape", np.int64, (3,)),
+])
+
+
+@dataclass
+class NodeRecord:
+    """Canvas node data as stored in a macro file, detached from Tk."""
+    label: str
+    type: str
+    x: float
+    y: float
+    bbox: Optional[Tuple[int, int, int, int]] = None
+    interrupt: bool = False
+    priority: int = 0
+    loop: bool = False
+    actions: list = field(default_factory=list)
+    outgoing: List[int] = field(default_factory=list)
+
+
+class _Writer:
+    def __init__(self):
+        self.nodes = []
+        self.labels = []
+        self.actions = []
+        self.payloads = []
+        self.blobs = []
+        self.size = 0
+
+    def payload(self, array) -> int:
+        array = np.ascontiguousarray(array)
+        if array.ndim > 3:
+            raise ValueError("Payloads may have at most 3 dimensions")
+        offset = -(-self.size // ALIGNMENT) * ALIGNMENT
+        shape = array.shape + (0,) * (3 - array.ndim)
+        self.payloads.append((offset, array.dtype.str, array.ndim, shape))
+        self.blobs.append((offset, array))
+        self.size = offset + array.nbytes
+        return len(self.payloads) - 1
+
+    def add_actions(self, actions):
+        start = len(self.actions)
+        for action in actions:
+            kind = ACTION_KINDS.index(type(action)) if type(action) in ACTION_KINDS else -1
+            if kind < 0:
+                raise TypeError(f"Cannot save action {action!r}")
+            button = BUTTONS.index(action.button) if hasattr(action, "button") else 0
+            self.actions.append((kind, getattr(action, "x", 0), getattr(action, "y", 0),
+                                 button, getattr(action, "key", "")))
+        return start, len(self.actions)
+
+    def add_node(self, label, kind, flags=0, priority=0, x=0.0, y=0.0, bbox=None,
+                 observer=NO_OBSERVER, threshold=0.0, tolerance=0, match_all=True,
+                 payload=-1, actions=()):
+        self.labels.append(label)
+        self.nodes.append((kind, flags, priority, x, y, bbox if bbox is not None else (0,) * 4, bbox is not None,
+                           observer, threshold, tolerance, match_all, payload, self.add_actions(actions)))
+
+    def add_observer(self, label, observer, flags, priority, baselines, actions=()):
+        if isinstance(observer, RegionObserver):
+            payload = -1
+            if baselines and observer.last_state is not None:
+                payload = self.payload(observer.last_state)
+            self.add_node(label, OBSERVER_NODE, flags, priority, bbox=observer.region, observer=REGION,
+                          threshold=observer.threshold, payload=payload, actions=actions)
+        elif isinstance(observer, ImageObserver):
+            self.add_node(label, OBSERVER_NODE, flags, priority, bbox=observer.region, observer=IMAGE,
+                          threshold=observer.threshold, payload=self.payload(observer.template.image),
+                          actions=actions)
+        elif isinstance(observer, PixelProbeObserver):
+            probes = np.hstack([np.asarray(observer.points, dtype=np.int32).reshape(-1, 2),
+                                np.asarray(observer.colors, dtype=np.int32).reshape(-1, 3)])
+            self.add_node(label, OBSERVER_NODE, flags, priority, observer=PROBE,
+                          tolerance=observer.tolerance, match_all=observer.match_all,
+                          payload=self.payload(probes), actions=actions)
+        else:
+            raise TypeError(f"Cannot save observer {observer!r}")
+
+    def write(self, path, edges, start):
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                version=np.int32(VERSION),
+                start=np.int32(start),
+                nodes=np.array(self.nodes, dtype=NODE_DTYPE),
+                labels=np.array(self.labels, dtype=str),
+                edges=np.asarray(edges, dtype=np.int32).reshape(-1, 2),
+                actions=np.array(self.actions, dtype=ACTION_DTYPE),
+                payloads=np.array(self.payloads, dtype=PAYLOAD_DTYPE),
+            )
+        with open(str(path) + SIDECAR_SUFFIX, "wb") as f:
+            for offset, array in self.blobs:
+                f.seek(offset)
+                f.write(array.tobytes())
+
+
+def save_graph(path, graph: RuntimeGraph, baselines=False):
+    """Save a RuntimeGraph; with ``baselines`` the RegionObservers' last frames are kept too."""
+    writer = _Writer()
+    for i, label in enumerate(graph.labels):
+        flags, priority = int(graph.flags[i]), int(graph.priorities[i])
+        observer = graph.observers[i]
+        if observer is None:
+            writer.add_node(label, ACTION_NODE, flags, priority, actions=graph.actions[i])
+        else:
+            # Observer nodes compiled from GraphNode chains carry actions too
+            writer.add_observer(label, observer, flags, priority, baselines, graph.actions[i])
+    edges = [(i, int(t)) for i in range(len(graph)) for t in graph.successors(i)]
+    writer.write(path, edges, graph.start)
+
+
+def save_canvas(path, nodes):
+    """Save canvas nodes (NodeWidgets or anything with their data attributes)."""
+    nodes = list(nodes)
+    index = {id(node): i for i, node in enumerate(nodes)}
+    writer = _Writer()
+    flags = []
+    for node in nodes:
+        priority = getattr(node, "priority", 0)
+        if node.type == "Observer":
+            flags.append(INTERRUPT if node.interrupt else 0)
+            writer.add_node(node.label, OBSERVER_NODE, flags[-1], priority, node.x, node.y, bbox=node.bbox,
+                            observer=REGION, threshold=getattr(node, "threshold", RegionObserver.threshold))
+        else:
+            flags.append(LOOP if node.loop else 0)
+            writer.add_node(node.label, ACTION_NODE, flags[-1], priority, node.x, node.y, actions=node.actions)
+    edges = [(index[id(node)], index[id(target)]) for node in nodes for target in node.outgoing]
+    # Start where compile_canvas would, so a reloaded macro runs the way the editor's does
+    writer.write(path, edges, entry_index(nodes, flags, edges))
+
+
+class MacroFile:
+    """
+    An opened macro file. The small tables are read up front; payloads are
+    sliced out of the memory-mapped sidecar only when an observer needs them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with np.load(path) as data:
+            version = int(data["version"])
+            if version > VERSION:
+                raise ValueError(f"{path}: unsupported macro file version {version}")
+            self.start = int(data["start"])
+            self.nodes = data["nodes"]
+            if version < 2:
+                # Version 1 marked an unset bbox with -1 coordinates
+                self.has_bbox = self.nodes["bbox"][:, 0] >= 0
+            else:
+                self.has_bbox = self.nodes["has_bbox"]
+            self.labels = data["labels"]
+            self.edges = data["edges"]
+            self.action_table = data["actions"]
+            self.payload_table = data["payloads"]
+        self._sidecar = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def payload(self, index) -> np.ndarray:
+        """Return payload ``index`` as a read-only view of the memory-mapped sidecar."""
+        if self._sidecar is None:
+            self._sidecar = np.memmap(str(self.path) + SIDECAR_SUFFIX, dtype=np.uint8, mode="r")
+        offset, dtype, ndim, shape = self.payload_table[index].item()
+        dtype = np.dtype(dtype)
+        shape = tuple(int(n) for n in shape[:ndim])
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        return self._sidecar[offset:offset + nbytes].view(dtype).reshape(shape)
+
+    def actions(self, i) -> list:
+        start, stop = self.nodes[i]["actions"]
+        actions = []
+        for kind, x, y, button, key in self.action_table[start:stop].tolist():
+            cls = ACTION_KINDS[kind]
+            if cls in (KeyPress, KeyDown, KeyUp):
+                actions.append(cls(key))
+            elif cls is MouseMove:
+                actions.append(MouseMove(x, y))
+            else:
+                actions.append(cls(x, y, BUTTONS[button]))
+        return actions
+
+    def observer(self, i, capture=None, probes=None, compact=False):
+        node = self.nodes[i]
+        kind = node["observer"]
+        label = self.labels[i]
+        if kind == NO_OBSERVER:
+            return None
+        if kind == PROBE:
+            table = self.payload(node["payload"])
+            return PixelProbeObserver(table[:, :2], table[:, 2:], int(node["tolerance"]),
+                                      bool(node["match_all"]), batch=probes)
+        if not self.has_bbox[i]:
+            raise ValueError(f"Observer node {label!r} has no region")
+        bbox = tuple(int(v) for v in node["bbox"])
+        if kind == IMAGE:
+            return ImageObserver(bbox, self.payload(node["payload"]), float(node["threshold"]),
+                                 capture=capture)
+        last_state = self.payload(node["payload"]) if node["payload"] >= 0 else None
+        return RegionObserver(bbox, int(node["threshold"]), last_state, capture=capture, compact=compact)
+
+    def graph(self, capture=None, probes=None, compact=False) -> RuntimeGraph:
+        """
+        Build the RuntimeGraph, creating observers (and reading their payloads) now.
+        Pixel probes share ``probes``, or one new ProbeBatch on ``capture``.
+        With ``compact`` RegionObservers keep tile summaries instead of full frames.
+        """
+        if probes is None:
+            probes = ProbeBatch(capture)
+        return build_graph(
+            labels=self.labels.tolist(),
+            observers=[self.observer(i, capture, probes, compact) for i in range(len(self))],
+            actions=[self.actions(i) for i in range(len(self))],
+            flags=self.nodes["flags"],
+            edges=self.edges,
+            start=self.start,
+            priorities=self.nodes["priority"],
+        )
+
+    def canvas_nodes(self) -> List[NodeRecord]:
+        records = []
+        for i, node in enumerate(self.nodes):
+            bbox = tuple(int(v) for v in node["bbox"])
+            records.append(NodeRecord(
+                label=str(self.labels[i]),
+                type="Observer" if node["kind"] == OBSERVER_NODE else "Action",
+                x=float(node["x"]),
+                y=float(node["y"]),
+                bbox=bbox if self.has_bbox[i] else None,
+                interrupt=bool(node["flags"] & INTERRUPT),
+                priority=int(node["priority"]),
+                loop=bool(node["flags"] & LOOP),
+                actions=self.actions(i),
+            ))
+        for source, target in self.edges.tolist():
+            records[source].outgoing.append(target)
+        return records
+
+
+def load_graph(path, capture=None, probes=None, compact=False) -> RuntimeGraph:
+    return MacroFile(path).graph(capture, probes, compact)
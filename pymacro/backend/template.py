@@ -0,0 +1,121 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def to_gray(frame):
+    """Return a float32 grayscale copy of an RGB(A) or single-channel frame."""
+    if frame.ndim == 3:
+        return frame[..., :3].astype(np.float32) @ GRAY_WEIGHTS
+    return frame.astype(np.float32)
+
+
+def downsample(img):
+    """Halve both dimensions by averaging 2x2 blocks."""
+    h, w = img.shape[0] // 2 * 2, img.shape[1] // 2 * 2
+    img = img[:h, :w]
+    return 0.25 * (img[0::2, 0::2] + img[1::2, 0::2] + img[0::2, 1::2] + img[1::2, 1::2])
+
+
+def window_sums(img, h, w):
+    """Sum of every ``h`` x ``w`` window of ``img``, via an integral image."""
+    table = np.zeros((img.shape[0] + 1, img.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(img, axis=0, dtype=np.float64), axis=1, out=table[1:, 1:])
+    return table[h:, w:] - table[:-h, w:] - table[h:, :-w] + table[:-h, :-w]
+
+
+class Template:
+    """
+    A reference image prepared for normalized cross-correlation search.
+
+    The grayscale pyramid, zero-mean levels and their norms are computed once
+    here; FFT spectra are cached per search size, so each match only pays for
+    transforming the frame and refining the best coarse candidates.
+    """
+
+    def __init__(self, image, min_size=8, max_levels=4, candidates=3, radius=2):
+        self.image = image
+        self.candidates = candidates
+        self.radius = radius
+        levels = [to_gray(image)]
+        while len(levels) <= max_levels and min(levels[-1].shape) // 2 >= min_size:
+            levels.append(downsample(levels[-1]))
+        self.levels = []
+        for level in levels:
+            centered = level - level.mean()
+            self.levels.append((centered, float(np.sqrt(np.sum(centered * centered)))))
+        self._spectra = {}
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        from PIL import Image
+        return cls(np.array(Image.open(path).convert('RGB')), **kwargs)
+
+    @property
+    def shape(self):
+        return self.levels[0][0].shape
+
+    def _spectrum(self, level, shape):
+        key = (level, shape)
+        if key not in self._spectra:
+            self._spectra[key] = np.conj(np.fft.rfft2(self.levels[level][0], s=shape))
+        return self._spectra[key]
+
+    def _ncc_map(self, img, level):
+        """NCC score for every placement of the template level inside ``img``."""
+        centered, norm = self.levels[level]
+        h, w = centered.shape
+        shape = img.shape
+        num = np.fft.irfft2(np.fft.rfft2(img) * self._spectrum(level, shape), s=shape)
+        num = num[:shape[0] - h + 1, :shape[1] - w + 1]
+        n = h * w
+        s1 = window_sums(img, h, w)
+        s2 = window_sums(img * img, h, w)
+        var = np.maximum(s2 - s1 * s1 / n, 0.0)
+        denom = norm * np.sqrt(var)
+        return np.divide(num, denom, out=np.zeros_like(num), where=denom > 1e-6)
+
+    def _refine(self, img, level, y, x):
+        """Best NCC placement within ``radius`` of ``(y, x)``, computed directly."""
+        centered, norm = self.levels[level]
+        h, w = centered.shape
+        r = self.radius
+        y0, x0 = max(0, y - r), max(0, x - r)
+        y1, x1 = min(img.shape[0] - h, y + r), min(img.shape[1] - w, x + r)
+        if y1 < y0 or x1 < x0:
+            return -1.0, (y, x)
+        patch = img[y0:y1 + h, x0:x1 + w]
+        windows = sliding_window_view(patch, (h, w))
+        windows = windows - windows.mean(axis=(2, 3), keepdims=True)
+        num = np.einsum('abij,ij->ab', windows, centered)
+        denom = norm * np.sqrt(np.einsum('abij,abij->ab', windows, windows))
+        scores = np.divide(num, denom, out=np.zeros_like(num), where=denom > 1e-6)
+        dy, dx = np.unravel_index(np.argmax(scores), scores.shape)
+        return float(scores[dy, dx]), (y0 + int(dy), x0 + int(dx))
+
+    def match(self, frame):
+        """Return ``(score, (x, y))`` for the best placement of the template in ``frame``."""
+        pyramid = [to_gray(frame)]
+        for _ in range(1, len(self.levels)):
+            pyramid.append(downsample(pyramid[-1]))
+        # Use the coarsest level that the frame can still contain
+        top = len(self.levels) - 1
+        while top >= 0 and any(p < t for p, t in zip(pyramid[top].shape, self.levels[top][0].shape)):
+            top -= 1
+        if top < 0:
+            return -1.0, (0, 0)
+
+        scores = self._ncc_map(pyramid[top], top)
+        k = min(self.candidates, scores.size)
+        flat = np.argpartition(scores.ravel(), -k)[-k:]
+        best = (-1.0, (0, 0))
+        for idx in flat:
+            y, x = np.unravel_index(idx, scores.shape)
+            score, loc = float(scores[y, x]), (int(y), int(x))
+            for level in range(top - 1, -1, -1):
+                score, loc = self._refine(pyramid[level], level, loc[0] * 2, loc[1] * 2)
+            if score > best[0]:
+                best = (score, loc)
+        score, (y, x) = best
+        return score, (x, y)
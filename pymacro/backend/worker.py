@@ -0,0 +1,247 @@
+"""
+Out-of-process screen capture.
+
+A ``CaptureWorker`` runs a frame source in a child process and writes every
+frame into a ``FrameRing``: a ``multiprocessing.shared_memory`` block holding
+a few preallocated frames, each stamped with a sequence number. The runner
+reads the newest frame as a NumPy view of the shared block, so capture time
+no longer adds to reaction latency and no frame is copied between processes.
+"""
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from pymacro.backend.observer import grab_box_region
+
+HEADER_ALIGNMENT = 64
+
+
+class FrameRing:
+    """
+    ``slots`` uint8 frames of one shape in shared memory.
+
+    The header holds the newest sequence number, then per slot the sequence
+    number it holds (-1 while being written) and its capture time. A frame
+    returned by ``latest()`` stays intact until ``slots - 1`` newer frames
+    have been written; ``intact(seq)`` tells whether that is still the case.
+    """
+
+    def __init__(self, shape, slots=4, name=None, create=False):
+        self.shape = tuple(int(n) for n in shape)
+        self.slots = slots
+        frame_bytes = int(np.prod(self.shape))
+        header_bytes = -(-8 * (1 + 2 * slots) // HEADER_ALIGNMENT) * HEADER_ALIGNMENT
+        size = header_bytes + slots * frame_bytes
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.owner = create
+        # frombuffer keeps the buffer exported while any view of it is alive
+        buf = np.frombuffer(self.shm.buf, dtype=np.uint8)
+        self._latest = buf[:8].view(np.int64)
+        self._seqs = buf[8:8 * (1 + slots)].view(np.int64)
+        self._times = buf[8 * (1 + slots):8 * (1 + 2 * slots)].view(np.float64)
+        self.frames = buf[header_bytes:size].reshape((slots,) + self.shape)
+        if create:
+            self._latest[0] = -1
+            self._seqs[:] = -1
+
+    @classmethod
+    def create(cls, shape, slots=4):
+        return cls(shape, slots, create=True)
+
+    @classmethod
+    def attach(cls, name, shape, slots=4):
+        return cls(shape, slots, name=name)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the newest complete frame, or -1 before the first."""
+        return int(self._latest[0])
+
+    def write(self, frame, timestamp=None) -> int:
+        frame = np.asarray(frame)
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match ring shape {self.shape}")
+        seq = self.seq + 1
+        slot = seq % self.slots
+        self._seqs[slot] = -1
+        np.copyto(self.frames[slot], frame)
+        self._times[slot] = time.monotonic() if timestamp is None else timestamp
+        self._seqs[slot] = seq
+        self._latest[0] = seq
+        return seq
+
+    def latest(self) -> Tuple[int, Optional[np.ndarray]]:
+        """Return ``(seq, frame)`` for the newest frame; ``frame`` is a view into shared memory."""
+        seq = self.seq
+        if seq < 0:
+            return seq, None
+        return seq, self.frames[seq % self.slots]
+
+    def timestamp(self, seq) -> float:
+        return float(self._times[seq % self.slots])
+
+    def intact(self, seq) -> bool:
+        """Whether frame ``seq`` has not been overwritten yet."""
+        return seq >= 0 and int(self._seqs[seq % self.slots]) == seq
+
+    def close(self):
+        """
+        Unmap the ring, and remove it if this process created it. Every frame
+        handed out by ``latest()`` must have been dropped first: shared memory
+        cannot be unmapped while a view of it is alive.
+        """
+        self._latest = self._seqs = self._times = self.frames = None
+        if self.owner:
+            self.shm.unlink()
+            self.owner = False
+        try:
+            self.shm.close()
+        except BufferError:
+            raise BufferError(f"Frames of ring {self.name!r} are still referenced; "
+                              f"drop them before closing it") from None
+
+
+class SyntheticSource:
+    """
+    Frame source for headless runs: a flat background with a square that
+    moves ``step`` pixels per frame. Each process calling it keeps its own
+    frame counter.
+    """
+
+    def __init__(self, width=640, height=480, size=32, step=8, background=64, color=(255, 255, 255)):
+        self.width = width
+        self.height = height
+        self.size = size
+        self.step = step
+        self.background = background
+        self.color = color
+        self.count = 0
+
+    def __call__(self, box=None):
+        frame = np.full((self.height, self.width, 3), self.background, dtype=np.uint8)
+        span = max(self.width - self.size, 1)
+        x = (self.count * self.step) % span
+        y = (self.height - self.size) // 2
+        frame[y:y + self.size, x:x + self.size] = self.color
+        self.count += 1
+        if box is None:
+            return frame
+        x1, y1, x2, y2 = map(int, box)
+        return frame[y1:y2, x1:x2]
+
+
+def _capture_loop(name, shape, slots, source, box, interval, stop):
+    ring = FrameRing.attach(name, shape, slots)
+    try:
+        due = time.monotonic()
+        while not stop.is_set():
+            ring.write(source(box))
+            due += interval
+            remaining = due - time.monotonic()
+            if remaining > 0:
+                stop.wait(remaining)
+            else:
+                due = time.monotonic()  # fell behind; don't try to catch up
+    finally:
+        ring.close()
+
+
+class CaptureWorker:
+    """
+    Grabs frames from ``source`` every ``interval`` seconds in a child process.
+
+    ``source(box)`` is called like ``grab_box_region`` and must be picklable.
+    The first frame is grabbed here to size the ring, so ``latest()`` never
+    returns an empty frame. ``grab`` has the signature CaptureCoordinator
+    expects; use it with ``full_screen=True`` and ``origin=worker.origin`` so
+    that every observer in a tick reads the same frame, and pass ``fresh`` so
+    that a frame about to be overwritten is replaced instead of read torn.
+    Frames returned by ``grab`` and ``latest`` view shared memory and must be
+    dropped (``CaptureCoordinator.release()``) before ``stop``.
+    """
+
+    def __init__(self, source=grab_box_region, box=None, interval=1 / 30, slots=4):
+        if slots < 3:
+            raise ValueError("CaptureWorker needs at least 3 ring slots")
+        self.source = source
+        self.box = tuple(map(int, box)) if box is not None else None
+        self.interval = interval
+        self.slots = slots
+        self.ring: Optional[FrameRing] = None
+        self._process = None
+        self._stop = None
+        self.seq = -1  # the frame the last grab() returned
+
+    @property
+    def origin(self) -> Tuple[int, int]:
+        return self.box[:2] if self.box is not None else (0, 0)
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self):
+        if self._process is not None:
+            return
+        first = np.asarray(self.source(self.box))
+        self.ring = FrameRing.create(first.shape, self.slots)
+        self.ring.write(first)
+        self._stop = multiprocessing.Event()
+        self._process = multiprocessing.Process(
+            target=_capture_loop,
+            args=(self.ring.name, first.shape, self.slots, self.source, self.box, self.interval, self._stop),
+            daemon=True,
+        )
+        self._process.start()
+
+    def stop(self, timeout=1.0):
+        if self._process is not None:
+            self._stop.set()
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+            self._process = None
+        if self.ring is not None:
+            # Raises while grabbed frames are alive; stop() can be called again once they are dropped
+            self.ring.close()
+            self.ring = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def latest(self) -> Tuple[int, np.ndarray]:
+        """Return ``(seq, frame)`` for the newest frame, without copying it."""
+        if self.ring is None:
+            raise RuntimeError("CaptureWorker is not running")
+        return self.ring.latest()
+
+    def grab(self, box=None) -> np.ndarray:
+        """View of ``box`` (screen coordinates) in the newest frame; the whole frame if ``box`` is None."""
+        self.seq, frame = self.latest()
+        if box is None:
+            return frame
+        ox, oy = self.origin
+        x1, y1, x2, y2 = map(int, box)
+        return frame[y1 - oy:y2 - oy, x1 - ox:x2 - ox]
+
+    def fresh(self) -> bool:
+        """
+        Whether the frame returned by the last ``grab`` is still safe to read
+        for at least one capture interval: its slot is intact and at most
+        ``slots - 3`` newer frames exist, so the writer is a frame away from
+        reusing it.
+        """
+        ring = self.ring
+        return ring is not None and ring.intact(self.seq) and ring.seq - self.seq <= self.slots - 3
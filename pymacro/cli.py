@@ -0,0 +1,174 @@
+"""
+Headless entry point: ``python -m pymacro run <macro>``.
+
+Only the backend is imported here; tkinter is never loaded, and the input
+and capture libraries are imported the first time they are used.
+"""
+import argparse
+import sys
+
+BACKENDS = ("pyautogui", "pynput", "dry-run")
+
+
+def make_backend(name):
+    from pymacro.backend import action
+    if name == "pynput":
+        return action.PynputBackend()
+    if name == "dry-run":
+        return action.DryRunBackend()
+    return action.PyAutoGUIBackend()
+
+
+def make_metrics(args):
+    """Metrics for --metrics/--profile-node, and the exporter that writes them; (None, None) when off."""
+    if not (args.metrics or args.profile_node):
+        return None, None
+    from pymacro.backend.metrics import Exporter, Metrics
+    metrics = Metrics()
+    if args.profile_node:
+        metrics.profile(args.profile_node)
+    exporter = Exporter(metrics, args.metrics, args.metrics_every) if args.metrics else None
+    if exporter is not None and args.metrics_every > 0:
+        exporter.start()
+    return metrics, exporter
+
+
+def finish_metrics(metrics, exporter):
+    if exporter is not None:
+        exporter.stop()
+    if metrics is not None and metrics.profiler is not None:
+        metrics.profiler.stop()
+        print(f"Profile of node {metrics.profiled_node!r}:\n{metrics.profiler.report()}", file=sys.stderr)
+
+
+def make_motion(args):
+    from pymacro.backend import random
+    random.seed(args.seed)
+    if not args.motion:
+        return None
+    from pymacro.backend.motion import MotionEngine
+    return MotionEngine(rng=args.seed)
+
+
+def run(args):
+    from pymacro.backend.action import ActionExecutor
+    from pymacro.backend.capture import CaptureCoordinator
+    from pymacro.backend.scheduler import Scheduler
+    from pymacro.backend.state import StateMachine
+    from pymacro.backend.storage import MacroFile
+
+    worker = None
+    if args.capture_process:
+        from pymacro.backend.worker import CaptureWorker
+        worker = CaptureWorker(interval=1 / args.capture_fps)
+        worker.start()
+        capture = CaptureCoordinator(grab=worker.grab, full_screen=True, fresh=worker.fresh, origin=worker.origin)
+    else:
+        capture = CaptureCoordinator() if args.shared_capture else None
+    graph = MacroFile(args.macro).graph(capture=capture, compact=args.compact_baselines)
+    metrics, exporter = make_metrics(args)
+    machine = StateMachine(
+        graph,
+        capture=capture,
+        scheduler=Scheduler(args.min_interval, args.max_interval),
+        executor=ActionExecutor(make_backend(args.backend), delay=args.delay, humanize=args.humanize,
+                                motion=make_motion(args)),
+        metrics=metrics,
+        workers=args.branch_workers,
+        branch_mode=args.branch_mode,
+    )
+    try:
+        machine.run()
+    except KeyboardInterrupt:
+        machine.stop()
+    finally:
+        if worker is not None:
+            capture.release()
+            worker.stop()
+        finish_metrics(metrics, exporter)
+    return 0
+
+
+def replay(args):
+    from pymacro.backend.replay import FrameTimeline, Replay
+
+    session = Replay(FrameTimeline.load(args.frames), delay=args.delay, humanize=args.humanize,
+                     min_interval=args.min_interval, max_interval=args.max_interval, motion=make_motion(args))
+    metrics, exporter = make_metrics(args)
+    try:
+        machine = session.run(session.machine(session.load(args.macro), metrics),
+                              until=args.until, max_ticks=args.max_ticks)
+    finally:
+        finish_metrics(metrics, exporter)
+    state = "halted" if machine.halted else f"at node {machine.graph.labels[machine.index]!r}"
+    print(f"{session.ticks} ticks, {len(session.backend.events)} actions, "
+          f"{session.clock() - session.timeline.start:.2f}s simulated in {session.wall_time:.2f}s; {state}")
+    if args.verbose:
+        for t, event, event_args in session.backend.events:
+            print(f"{t:10.3f} {event} {' '.join(map(str, event_args))}")
+    return 0
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="write timings and counters here (Prometheus text for .prom/.txt, else JSON)")
+    parser.add_argument("--metrics-every", type=float, default=10.0, metavar="SECONDS",
+                        help="also rewrite the metrics file this often; 0 writes it only on exit")
+    parser.add_argument("--profile-node", metavar="LABEL",
+                        help="sample the call stack while this node runs and print a profile on exit")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pymacro", description="Run saved macros without the editor.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a saved macro until it halts or is interrupted")
+    run_parser.add_argument("macro", help="path to a .pymacro file")
+    run_parser.add_argument("--backend", choices=BACKENDS, default="pyautogui", help="input backend")
+    run_parser.add_argument("--delay", type=float, default=0.1, help="seconds between actions")
+    run_parser.add_argument("--humanize", action="store_true", help="jitter positions and delays")
+    run_parser.add_argument("--motion", action="store_true",
+                            help="move the pointer to each target along a human-like path")
+    run_parser.add_argument("--seed", type=int, help="seed for jitter, delays and paths, for reproducible runs")
+    run_parser.add_argument("--min-interval", type=float, default=0.02, help="fastest poll interval")
+    run_parser.add_argument("--max-interval", type=float, default=0.25, help="slowest poll interval")
+    run_parser.add_argument("--shared-capture", action="store_true",
+                            help="grab the screen once per tick for all observers")
+    run_parser.add_argument("--capture-process", action="store_true",
+                            help="capture the screen in a separate process (implies --shared-capture)")
+    run_parser.add_argument("--capture-fps", type=float, default=30.0,
+                            help="frames per second grabbed by the capture process")
+    run_parser.add_argument("--compact-baselines", action="store_true",
+                            help="keep per-tile summaries instead of full frames for region observers; "
+                                 "a region's first change is estimated from the summaries and may be missed")
+    run_parser.add_argument("--branch-workers", type=int, default=4,
+                            help="threads evaluating the observers of a branching node together")
+    run_parser.add_argument("--branch-mode", choices=("priority", "first"), default="priority",
+                            help="follow the highest-priority triggered branch, or the first to trigger")
+    add_metrics_arguments(run_parser)
+    run_parser.set_defaults(func=run)
+
+    replay_parser = commands.add_parser("replay", help="simulate a macro against recorded frames on a virtual clock")
+    replay_parser.add_argument("macro", help="path to a .pymacro file")
+    replay_parser.add_argument("frames", help="frame timeline (.npz with 'frames' and 'times')")
+    replay_parser.add_argument("--delay", type=float, default=0.1, help="seconds between actions")
+    replay_parser.add_argument("--humanize", action="store_true", help="jitter positions and delays")
+    replay_parser.add_argument("--motion", action="store_true", help="simulate human-like pointer paths")
+    replay_parser.add_argument("--seed", type=int, help="seed for jitter, delays and paths")
+    replay_parser.add_argument("--min-interval", type=float, default=0.02, help="fastest poll interval")
+    replay_parser.add_argument("--max-interval", type=float, default=0.25, help="slowest poll interval")
+    replay_parser.add_argument("--until", type=float, help="stop at this virtual time (default: end of frames)")
+    replay_parser.add_argument("--max-ticks", type=int, help="stop after this many ticks")
+    replay_parser.add_argument("-v", "--verbose", action="store_true", help="print every action performed")
+    add_metrics_arguments(replay_parser)
+    replay_parser.set_defaults(func=replay)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,9 @@
+import os
+import sys
+
+# Make the pymacro package importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from ui.main import MainWindow
 
 if __name__ == "__main__":
@@ -0,0 +1,43 @@
+class EdgeIndex:
+    """
+    The canvas edges, indexed by node and by (source, target) pair, so
+    finding, updating or removing the edges of a node costs O(degree)
+    instead of a scan over every edge. Iterates in insertion order.
+    """
+
+    def __init__(self):
+        self._pairs = {}    # (source, target) -> edge
+        self._by_node = {}  # node -> {edge: None}, an insertion-ordered set
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def __iter__(self):
+        return iter(list(self._pairs.values()))
+
+    def __contains__(self, edge):
+        return self._pairs.get((edge.source, edge.target)) is edge
+
+    def add(self, edge):
+        self._pairs[(edge.source, edge.target)] = edge
+        self._by_node.setdefault(edge.source, {})[edge] = None
+        self._by_node.setdefault(edge.target, {})[edge] = None
+
+    def remove(self, edge):
+        if self._pairs.get((edge.source, edge.target)) is not edge:
+            return
+        del self._pairs[(edge.source, edge.target)]
+        for node in (edge.source, edge.target):
+            edges = self._by_node.get(node)
+            if edges is not None:
+                edges.pop(edge, None)
+                if not edges:
+                    del self._by_node[node]
+
+    def get(self, source, target):
+        """Return the edge from ``source`` to ``target``, or None."""
+        return self._pairs.get((source, target))
+
+    def edges_of(self, node):
+        """Every edge that starts or ends at ``node``."""
+        return list(self._by_node.get(node, ()))
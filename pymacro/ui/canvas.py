@@ -1,25 +1,170 @@
 import tkinter as tk
-from ui.nodes import NodeWidget, EdgeWidget
+from ui.adjacency import EdgeIndex
+from ui.nodes import NODE_TAG, NodeWidget, EdgeWidget
+from ui.spatial import GridIndex
+
+from pymacro.backend.storage import MacroFile, save_canvas
+
+# (event sequence, NodeWidget handler, starts a gesture)
+NODE_EVENTS = [
+    ("<ButtonPress-1>", "on_left_click", True),
+    ("<B1-Motion>", "on_drag", False),
+    ("<ButtonRelease-1>", "on_drop", False),
+    ("<ButtonPress-3>", "on_right_press", True),
+    ("<B3-Motion>", "on_right_drag", False),
+    ("<ButtonRelease-3>", "on_right_release", False),
+]
+
 
 class GraphCanvas(tk.Canvas):
     def __init__(self, master, on_select, **kwargs):
         super().__init__(master, bg="white", **kwargs)
-        self.nodes = []
-        self.edges = []
+        self.nodes = {}  # NodeWidget -> None, an insertion-ordered set
+        self.edges = EdgeIndex()
         self.on_select = on_select
+        # Action nodes only, for the trigger dropdown; the version changes
+        # whenever an Action node is added, removed or renamed.
+        self.action_nodes = {}
+        self.action_version = 0
+
+        # Node events are bound once for the whole class of items and routed
+        # to the NodeWidget that owns the item under the pointer.
+        self._item_nodes = {}
+        self._active_node = None
+        for sequence, handler, starts in NODE_EVENTS:
+            self.tag_bind(NODE_TAG, sequence,
+                          lambda event, h=handler, s=starts: self._dispatch(h, s, event))
+
+        # Nodes whose edges need redrawing at the next idle frame
+        self._dirty = {}
+        self._redraw_pending = False
+
+        # Spatial indexes for hit-testing and culling; items outside the
+        # viewport are hidden.
+        self.node_index = GridIndex()
+        self.edge_index = GridIndex()
+        self._shown_nodes = set()
+        self._shown_edges = set()
+        self._viewport_stale = True
+        self.bind("<Configure>", lambda event: self.schedule_viewport())
+        # Middle-button drag pans the view
+        self.bind("<ButtonPress-2>", lambda event: self.scan_mark(event.x, event.y))
+        self.bind("<B2-Motion>", self.on_pan)
+
+    def register_item(self, item, node):
+        self._item_nodes[item] = node
+
+    def unregister_item(self, item):
+        self._item_nodes.pop(item, None)
+
+    def _dispatch(self, handler, starts_gesture, event):
+        if starts_gesture:
+            current = self.find_withtag("current")
+            self._active_node = self._item_nodes.get(current[0]) if current else None
+        if self._active_node is not None:
+            getattr(self._active_node, handler)(event)
+
+    def _schedule(self):
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.after_idle(self._redraw)
+
+    def schedule_redraw(self, node):
+        """
+        Note that ``node`` moved or changed. Its place in the spatial index is
+        updated now; its edges are redrawn with every other queued node in
+        one idle callback.
+        """
+        self.node_index.update(node, node.bounds())
+        self._dirty[node] = None
+        self._viewport_stale = True
+        self._schedule()
+
+    def schedule_viewport(self):
+        self._viewport_stale = True
+        self._schedule()
+
+    def _redraw(self):
+        self._redraw_pending = False
+        dirty, self._dirty = self._dirty, {}
+        done = set()
+        for node in dirty:
+            for edge in self.edges.edges_of(node):
+                if edge not in done:
+                    done.add(edge)
+                    self._move_edge(edge)
+        if self._viewport_stale:
+            self.update_viewport()
+
+    def _move_edge(self, edge):
+        edge.update_position()
+        self.edge_index.update(edge, edge.bounds())
+
+    def on_pan(self, event):
+        self.scan_dragto(event.x, event.y, gain=1)
+        self.schedule_viewport()
+
+    def viewport(self):
+        x1, y1 = self.canvasx(0), self.canvasy(0)
+        return (x1, y1, x1 + self.winfo_width(), y1 + self.winfo_height())
+
+    def nodes_at(self, x, y):
+        """Nodes under canvas point ``(x, y)``."""
+        return self.node_index.at(x, y)
+
+    def update_viewport(self):
+        """Show the nodes and edges inside the viewport and hide the ones that left it."""
+        self._viewport_stale = False
+        view = self.viewport()
+        nodes = self.node_index.query(view)
+        edges = self.edge_index.query(view)
+        for node in self._shown_nodes - nodes:
+            node.set_visible(False)
+        for node in nodes - self._shown_nodes:
+            node.set_visible(True)
+        for edge in self._shown_edges - edges:
+            self.itemconfig(edge.line_id, state=tk.HIDDEN)
+        for edge in edges - self._shown_edges:
+            self.itemconfig(edge.line_id, state=tk.NORMAL)
+        self._shown_nodes = nodes
+        self._shown_edges = edges
 
     def add_node(self, x, y, label, node_type):
         node = NodeWidget(self, x, y, label, node_type, self.on_select)
-        self.nodes.append(node)
+        self.nodes[node] = None
+        if node_type == "Action":
+            self.action_nodes[node] = None
+            self.action_version += 1
+        # New items start visible; the next viewport update hides them if needed
+        self._shown_nodes.add(node)
+        self.schedule_redraw(node)
+        return node
 
     def add_edge(self, source_node, target_node):
+        existing = self.edges.get(source_node, target_node)
+        if existing is not None:
+            return existing
         edge = EdgeWidget(self, source_node, target_node)
-        self.edges.append(edge)
+        self.edges.add(edge)
+        self.edge_index.insert(edge, edge.bounds())
+        self._shown_edges.add(edge)
+        self.schedule_viewport()
+        return edge
+
+    def rename_node(self, node, label):
+        node.label = label
+        node.update_label()
+        if node in self.action_nodes:
+            self.action_version += 1
 
-    def update_edges(self, moved_node):
-        for edge in self.edges:
-            if edge.source == moved_node or edge.target == moved_node:
-                edge.update_position()
+    def forget_node(self, node):
+        """Drop a deleted node from the canvas bookkeeping."""
+        self.nodes.pop(node, None)
+        if self.action_nodes.pop(node, 0) is None:
+            self.action_version += 1
+        self.node_index.remove(node)
+        self._shown_nodes.discard(node)
+        self._dirty.pop(node, None)
 
     def remove_edge(self, edge):
         """
@@ -30,12 +175,36 @@ class GraphCanvas(tk.Canvas):
         self.delete(edge.line_id)
 
         # 2) Remove the connection record from NodeWidget.incoming/outgoing:
-        if edge.source in self.nodes and edge.target in self.nodes:
-            if edge.target in edge.source.outgoing:
-                edge.source.outgoing.remove(edge.target)
-            if edge.source in edge.target.incoming:
-                edge.target.incoming.remove(edge.source)
-
-        # 3) Remove the EdgeWidget object from our list:
-        if edge in self.edges:
-            self.edges.remove(edge)
\ No newline at end of file
+        if edge.target in edge.source.outgoing:
+            edge.source.outgoing.remove(edge.target)
+        if edge.source in edge.target.incoming:
+            edge.target.incoming.remove(edge.source)
+
+        # 3) Remove the EdgeWidget object from the indexes:
+        self.edges.remove(edge)
+        self.edge_index.remove(edge)
+        self._shown_edges.discard(edge)
+
+    def save(self, path):
+        save_canvas(path, self.nodes)
+
+    def load(self, path):
+        """Replace the current graph with the one saved at ``path``."""
+        records = MacroFile(path).canvas_nodes()
+        for node in list(self.nodes):
+            node.delete()
+        nodes = []
+        for record in records:
+            node = self.add_node(record.x, record.y, record.label, record.type)
+            if record.type == "Action":
+                node.actions = record.actions
+                node.loop = record.loop
+            else:
+                node.bbox = record.bbox
+                node.interrupt = record.interrupt
+                node.priority = record.priority
+            node.refresh_appearance()
+            nodes.append(node)
+        for record, node in zip(records, nodes):
+            for target in record.outgoing:
+                self.add_edge(node, nodes[target])
@@ -1,6 +1,9 @@
 import tkinter as tk
 from tkinter import messagebox
 
+# Canvas tag shared by every node item; GraphCanvas binds node events to it once
+NODE_TAG = "node"
+
 class NodeWidget:
     WIDTH = 120
     HEIGHT = 60
@@ -19,49 +22,59 @@ class NodeWidget:
         else:  # Observer
             self.bbox = None   # (x1, y1, x2, y2)
             self.interrupt = False
+            self.priority = 0  # interrupts with higher priority are checked first
 
         # Track connections
         self.incoming = []  # list of source NodeWidgets
         self.outgoing = []  # list of target NodeWidgets
 
-        # Appearance: create shape and text
+        # Appearance: create shape and text. Events reach us through the
+        # canvas-wide bindings on NODE_TAG, not per-item bindings.
+        self._shape_kind = None
         self.create_shape()
-        self.text_id = self.canvas.create_text(x + self.WIDTH/2, y + self.HEIGHT/2, text=f"{node_type}: {label}")
+        self.text_id = self.canvas.create_text(x + self.WIDTH/2, y + self.HEIGHT/2, text=f"{node_type}: {label}",
+                                               tags=(NODE_TAG,))
+        self.canvas.register_item(self.text_id, self)
 
         self._drag_data = {"x": 0, "y": 0}
         self._edge_line = None
 
-        # Bindings
-        for item in [self.shape_id, self.text_id]:
-            canvas.tag_bind(item, "<ButtonPress-1>", self.on_left_click)
-            canvas.tag_bind(item, "<B1-Motion>", self.on_drag)
-            canvas.tag_bind(item, "<ButtonRelease-1>", self.on_drop)
-            canvas.tag_bind(item, "<ButtonPress-3>", self.on_right_press)
-            canvas.tag_bind(item, "<B3-Motion>", self.on_right_drag)
-            canvas.tag_bind(item, "<ButtonRelease-3>", self.on_right_release)
+    def shape_kind(self):
+        if self.type == "Action" and self.loop:
+            return "oval"
+        if self.type == "Observer" and self.interrupt:
+            return "diamond"
+        return "rectangle"
+
+    def shape_coords(self):
+        x1, y1 = self.x, self.y
+        x2, y2 = x1 + self.WIDTH, y1 + self.HEIGHT
+        if self._shape_kind == "diamond":
+            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+            return [cx, y1, x2, cy, cx, y2, x1, cy]
+        return [x1, y1, x2, y2]
 
     def create_shape(self):
         # Remove existing if any
         if hasattr(self, 'shape_id'):
+            self.canvas.unregister_item(self.shape_id)
             self.canvas.delete(self.shape_id)
-        x1, y1 = self.x, self.y
-        x2, y2 = x1 + self.WIDTH, y1 + self.HEIGHT
+        self._shape_kind = self.shape_kind()
+        coords = self.shape_coords()
+        fill_color = "lightgreen" if self.type == "Action" else "lightblue"
         # Determine shape based on flags
-        if self.type == "Action" and self.loop:
-            self.shape_id = self.canvas.create_oval(x1, y1, x2, y2,
-                                                    fill="lightgreen", outline="green", width=2)
-        elif self.type == "Observer" and self.interrupt:
-            # Create a diamond centered in bounding box
-            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
-            points = [cx, y1, x2, cy, cx, y2, x1, cy]
-            self.shape_id = self.canvas.create_polygon(points,
-                                                       fill="lightblue", outline="blue", width=2)
+        if self._shape_kind == "oval":
+            self.shape_id = self.canvas.create_oval(*coords, fill=fill_color, width=2, tags=(NODE_TAG,))
+        elif self._shape_kind == "diamond":
+            # Diamond centered in bounding box
+            self.shape_id = self.canvas.create_polygon(coords, fill=fill_color, width=2, tags=(NODE_TAG,))
         else:
             # Default rectangle
-            fill_color = "lightgreen" if self.type == "Action" else "lightblue"
-            outline_color = "black"
-            self.shape_id = self.canvas.create_rectangle(x1, y1, x2, y2,
-                                                          fill=fill_color, outline=outline_color, width=2)
+            self.shape_id = self.canvas.create_rectangle(*coords, fill=fill_color, width=2, tags=(NODE_TAG,))
+        self.canvas.register_item(self.shape_id, self)
+        if hasattr(self, 'text_id'):
+            # Keep the label above the new shape
+            self.canvas.tag_raise(self.text_id, self.shape_id)
         self.update_colors()
 
     def update_colors(self):
@@ -74,18 +87,15 @@ class NodeWidget:
             self.canvas.itemconfig(self.shape_id, outline="green" if self.loop else "black")
 
     def refresh_appearance(self):
-        coords = self.canvas.coords(self.shape_id)
-        self.x, self.y = coords[0], coords[1]
-        self.create_shape()
-        self.canvas.delete(self.text_id)
-        self.text_id = self.canvas.create_text(self.x + self.WIDTH/2, self.y + self.HEIGHT/2, text=f"{self.type}: {self.label}")
-        for item in [self.shape_id, self.text_id]:
-            self.canvas.tag_bind(item, "<ButtonPress-1>", self.on_left_click)
-            self.canvas.tag_bind(item, "<B1-Motion>", self.on_drag)
-            self.canvas.tag_bind(item, "<ButtonRelease-1>", self.on_drop)
-            self.canvas.tag_bind(item, "<ButtonPress-3>", self.on_right_press)
-            self.canvas.tag_bind(item, "<B3-Motion>", self.on_right_drag)
-            self.canvas.tag_bind(item, "<ButtonRelease-3>", self.on_right_release)
+        """Bring the canvas items in line with the node's data, reusing them where possible."""
+        if self.shape_kind() != self._shape_kind:
+            self.create_shape()
+        else:
+            self.canvas.coords(self.shape_id, *self.shape_coords())
+            self.update_colors()
+        self.canvas.coords(self.text_id, self.x + self.WIDTH/2, self.y + self.HEIGHT/2)
+        self.update_label()
+        self.canvas.schedule_redraw(self)
 
     def on_left_click(self, event):
         self.on_select_callback(self)
@@ -97,33 +107,34 @@ class NodeWidget:
         dy = event.y - self._drag_data["y"]
         self.canvas.move(self.shape_id, dx, dy)
         self.canvas.move(self.text_id, dx, dy)
+        self.x += dx
+        self.y += dy
         self._drag_data["x"] = event.x
         self._drag_data["y"] = event.y
-        self.canvas.update_edges(self)
+        self.canvas.schedule_redraw(self)
 
     def on_drop(self, event):
         pass
 
+    def event_point(self, event):
+        # The view can be panned, so map window coordinates to canvas coordinates
+        return self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+
     def on_right_press(self, event):
-        sx, sy = self.get_boundary_point_towards(event.x, event.y)
-        self._edge_line = self.canvas.create_line(sx, sy, event.x, event.y, arrow=tk.LAST, dash=(4, 2), fill="gray")
+        x, y = self.event_point(event)
+        sx, sy = self.get_boundary_point_towards(x, y)
+        self._edge_line = self.canvas.create_line(sx, sy, x, y, arrow=tk.LAST, dash=(4, 2), fill="gray")
 
     def on_right_drag(self, event):
         if self._edge_line:
-            sx, sy = self.get_boundary_point_towards(event.x, event.y)
-            self.canvas.coords(self._edge_line, sx, sy, event.x, event.y)
+            x, y = self.event_point(event)
+            sx, sy = self.get_boundary_point_towards(x, y)
+            self.canvas.coords(self._edge_line, sx, sy, x, y)
 
     def on_right_release(self, event):
         if not self._edge_line:
             return
-        target = None
-        for node in self.canvas.nodes:
-            if node == self:
-                continue
-            x1, y1, x2, y2 = self.canvas.bbox(node.shape_id)
-            if x1 <= event.x <= x2 and y1 <= event.y <= y2:
-                target = node
-                break
+        target = next((node for node in self.canvas.nodes_at(*self.event_point(event)) if node is not self), None)
         if target:
             if self.type == "Observer" and target.type == "Action":
                 if self.outgoing:
@@ -138,14 +149,19 @@ class NodeWidget:
         self.canvas.delete(self._edge_line)
         self._edge_line = None
 
+    def bounds(self):
+        return (self.x, self.y, self.x + self.WIDTH, self.y + self.HEIGHT)
+
+    def set_visible(self, visible):
+        state = tk.NORMAL if visible else tk.HIDDEN
+        self.canvas.itemconfig(self.shape_id, state=state)
+        self.canvas.itemconfig(self.text_id, state=state)
+
     def get_center(self):
-        coords = self.canvas.coords(self.shape_id)
-        xs = coords[::2]
-        ys = coords[1::2]
-        return (sum(xs) / len(xs), sum(ys) / len(ys))
+        return (self.x + self.WIDTH / 2, self.y + self.HEIGHT / 2)
 
     def get_boundary_point_towards(self, tx, ty):
-        x1, y1, x2, y2 = self.canvas.bbox(self.shape_id)
+        x1, y1, x2, y2 = self.bounds()
         cx, cy = self.get_center()
         dx = tx - cx
         dy = ty - cy
@@ -158,24 +174,15 @@ class NodeWidget:
         self.canvas.itemconfig(self.text_id, text=f"{self.type}: {self.label}")
 
     def delete(self):
-        # remove all incoming edges
-        for src_node in list(self.incoming):
-            for edge in list(self.canvas.edges):
-                if edge.source == src_node and edge.target == self:
-                    self.canvas.remove_edge(edge)
-                    break
-        # remove all outgoing edges
-        for dst_node in list(self.outgoing):
-            for edge in list(self.canvas.edges):
-                if edge.source == self and edge.target == dst_node:
-                    self.canvas.remove_edge(edge)
-                    break
+        # remove all incoming and outgoing edges
+        for edge in self.canvas.edges.edges_of(self):
+            self.canvas.remove_edge(edge)
         # delete our shape & text
-        self.canvas.delete(self.shape_id)
-        self.canvas.delete(self.text_id)
-        # remove self from canvas.nodes
-        if self in self.canvas.nodes:
-            self.canvas.nodes.remove(self)
+        for item in (self.shape_id, self.text_id):
+            self.canvas.unregister_item(item)
+            self.canvas.delete(item)
+        # remove self from canvas.nodes and the spatial index
+        self.canvas.forget_node(self)
 
 
 class EdgeWidget:
@@ -189,14 +196,20 @@ class EdgeWidget:
         # Initial draw
         self.line_id = self.draw_edge()
 
-    def draw_edge(self):
+    def path(self):
         # Compute multi-segment orthogonal path
         sx, sy = self.source.get_boundary_point_towards(*self.target.get_center())
         tx, ty = self.target.get_boundary_point_towards(*self.source.get_center())
         mx = (sx + tx) / 2
-        points = [sx, sy, mx, sy, mx, ty, tx, ty]
-        return self.canvas.create_line(*points, arrow=tk.LAST, dash=(4,2), fill="gray")
+        return [sx, sy, mx, sy, mx, ty, tx, ty]
+
+    def draw_edge(self):
+        return self.canvas.create_line(*self.path(), arrow=tk.LAST, dash=(4,2), fill="gray")
 
     def update_position(self):
-        self.canvas.delete(self.line_id)
-        self.line_id = self.draw_edge()
+        self.canvas.coords(self.line_id, *self.path())
+
+    def bounds(self):
+        points = self.path()
+        xs, ys = points[0::2], points[1::2]
+        return (min(xs), min(ys), max(xs), max(ys))
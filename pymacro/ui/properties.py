@@ -1,5 +1,81 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk
+
+from pymacro.backend.recorder import Recorder, drop_stop_click
+
+
+class VirtualList(ttk.Frame):
+    """Read-only list that only materializes the rows currently in view."""
+
+    def __init__(self, master, height=5):
+        super().__init__(master)
+        self.height = height
+        self.items = []
+        self.offset = 0
+        self.format = lambda idx, item: f"{idx+1}: {item}"
+        self.listbox = tk.Listbox(self, height=height)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scroll)
+        self.listbox.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll_to(self.offset - (1 if event.delta > 0 else -1)))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll_to(self.offset - 1))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll_to(self.offset + 1))
+
+    def set_items(self, items):
+        self.items = items
+        self.offset = 0
+        self.refresh()
+
+    def refresh(self):
+        end = min(len(self.items), self.offset + self.height)
+        self.listbox.delete(0, tk.END)
+        for idx in range(self.offset, end):
+            self.listbox.insert(tk.END, self.format(idx, self.items[idx]))
+        total = max(len(self.items), 1)
+        self.scrollbar.set(self.offset / total, max(end, 1) / total)
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.items) - self.height))
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+
+    def on_scroll(self, command, value, unit=None):
+        if command == "moveto":
+            self.scroll_to(int(float(value) * len(self.items)))
+        elif command == "scroll":
+            step = self.height if unit == "pages" else 1
+            self.scroll_to(self.offset + int(value) * step)
+
+
+class EdgeRows(ttk.Frame):
+    """Rows of '• label [delete]' for connected nodes, reusing row widgets between nodes."""
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.rows = []
+        self.empty = ttk.Label(self, text="• None")
+
+    def show(self, nodes, on_delete):
+        while len(self.rows) < len(nodes):
+            frame = ttk.Frame(self)
+            label = ttk.Label(frame)
+            label.pack(side=tk.LEFT, anchor=tk.W)
+            button = ttk.Button(frame, text="delete", width=5)
+            button.pack(side=tk.RIGHT)
+            self.rows.append((frame, label, button))
+        for i, (frame, label, button) in enumerate(self.rows):
+            if i < len(nodes):
+                label.configure(text=f"• {nodes[i].label}")
+                button.configure(command=lambda n=nodes[i]: on_delete(n))
+                frame.pack(fill=tk.X, pady=1)
+            else:
+                frame.pack_forget()
+        if nodes:
+            self.empty.pack_forget()
+        else:
+            self.empty.pack(anchor=tk.W)
+
 
 class PropertyPanel(tk.LabelFrame):
     def __init__(self, master, canvas=None):
@@ -7,145 +83,191 @@ class PropertyPanel(tk.LabelFrame):
         self.node = None
         # Accept canvas explicitly or get from master if not provided
         self.canvas = canvas if canvas is not None else getattr(master, 'canvas', None)
+        # Widgets are built on first use and then only updated
+        self.body = None
+        self._menu_version = None
+        self._trigger_target = None
 
-    def clear_panel(self):
-        for widget in self.winfo_children():
-            widget.destroy()
-
-    def set_node(self, node):
-        self.node = node
-        self.clear_panel()
+    def build(self):
+        self.body = ttk.Frame(self)
 
-        ttk.Label(self, text=f"{node.type} Node: {node.label}", font=(None, 10, 'bold')).pack(anchor=tk.W)
+        self.title_var = tk.StringVar()
+        ttk.Label(self.body, textvariable=self.title_var, font=(None, 10, 'bold')).pack(anchor=tk.W)
 
-        ttk.Label(self, text="Label:").pack(anchor=tk.W, pady=(5, 0))
-        self.label_var = tk.StringVar(value=node.label)
-        ttk.Entry(self, textvariable=self.label_var).pack(fill=tk.X)
-        ttk.Button(self, text="Apply Label", command=self.apply_label).pack(pady=(2, 10))
+        ttk.Label(self.body, text="Label:").pack(anchor=tk.W, pady=(5, 0))
+        self.label_var = tk.StringVar()
+        ttk.Entry(self.body, textvariable=self.label_var).pack(fill=tk.X)
+        ttk.Button(self.body, text="Apply Label", command=self.apply_label).pack(pady=(2, 10))
 
         # ------ INCOMING SECTION ------
-        ttk.Label(self, text="Incoming:").pack(anchor=tk.W)
-        if node.incoming:
-            for src_node in node.incoming:
-                frame = ttk.Frame(self)
-                frame.pack(fill=tk.X, pady=1)
-
-                # Show the source‐node label
-                ttk.Label(frame, text=f"• {src_node.label}").pack(side=tk.LEFT, anchor=tk.W)
-                # Button to remove the edge (src_node → this node)
-                ttk.Button(frame,
-                           text="delete",
-                           width=5,
-                           command=lambda s=src_node: self.remove_edge_pair(s, node)
-                          ).pack(side=tk.RIGHT)
-        else:
-            ttk.Label(self, text="• None").pack(anchor=tk.W)
+        ttk.Label(self.body, text="Incoming:").pack(anchor=tk.W)
+        self.incoming_rows = EdgeRows(self.body)
+        self.incoming_rows.pack(fill=tk.X)
 
         # ------ OUTGOING SECTION ------
-        ttk.Label(self, text="Outgoing:").pack(anchor=tk.W, pady=(5,0))
-        if node.outgoing:
-            for dst_node in node.outgoing:
-                frame = ttk.Frame(self)
-                frame.pack(fill=tk.X, pady=1)
+        ttk.Label(self.body, text="Outgoing:").pack(anchor=tk.W, pady=(5,0))
+        self.outgoing_rows = EdgeRows(self.body)
+        self.outgoing_rows.pack(fill=tk.X)
 
-                ttk.Label(frame, text=f"• {dst_node.label}").pack(side=tk.LEFT, anchor=tk.W)
-                ttk.Button(frame,
-                           text="delete",
-                           width=5,
-                           command=lambda d=dst_node: self.remove_edge_pair(node, d)
-                          ).pack(side=tk.RIGHT)
-        else:
-            ttk.Label(self, text="• None").pack(anchor=tk.W)
+        # ------ TYPE-SPECIFIC SECTIONS, packed on demand ------
+        self.action_frame = self.build_action_properties()
+        self.observer_frame = self.build_observer_properties()
+
+        # ------ DELETE NODE BUTTON ------
+        self.footer = ttk.Frame(self.body)
+        ttk.Separator(self.footer, orient="horizontal").pack(fill=tk.X, pady=10)
+        ttk.Button(self.footer, text="Delete Node", command=self.delete_node).pack(pady=(0, 10))
+        self.footer.pack(fill=tk.X, side=tk.BOTTOM)
+
+    def clear_panel(self):
+        if self.body is not None:
+            self.body.pack_forget()
+
+    def set_node(self, node):
+        if self.body is None:
+            self.build()
+        self.node = node
+        self.body.pack(fill=tk.BOTH, expand=True)
+
+        self.title_var.set(f"{node.type} Node: {node.label}")
+        self.label_var.set(node.label)
+        self.incoming_rows.show(node.incoming, lambda s: self.remove_edge_pair(s, node))
+        self.outgoing_rows.show(node.outgoing, lambda d: self.remove_edge_pair(node, d))
 
         if node.type == "Action":
-            self.build_action_properties(node)
+            self.observer_frame.pack_forget()
+            self.action_frame.pack(fill=tk.BOTH, expand=True)
+            self.loop_var.set(node.loop)
+            self.actions_list.set_items(node.actions)
         else:
-            self.build_observer_properties(node)
-
-        # ------ DELETE NODE BUTTON ------
-        ttk.Separator(self, orient="horizontal").pack(fill=tk.X, pady=10)
-        ttk.Button(self, text="Delete Node", command=self.delete_node).pack(pady=(0, 10))
+            self.action_frame.pack_forget()
+            self.observer_frame.pack(fill=tk.X)
+            self.interrupt_var.set(node.interrupt)
+            self.priority_var.set(node.priority)
+            self.refresh_trigger_menu(node)
 
     def apply_label(self):
         if self.node:
-            self.node.label = self.label_var.get()
-            self.node.update_label()
+            self.canvas.rename_node(self.node, self.label_var.get())
             self.set_node(self.node)
 
-    def build_action_properties(self, node):
-        self.loop_var = tk.BooleanVar(value=node.loop)
-        ttk.Checkbutton(self, text="Loop", variable=self.loop_var, command=lambda: self.toggle_loop(node)).pack(anchor=tk.W, pady=(5,0))
+    def build_action_properties(self):
+        frame = ttk.Frame(self.body)
+        self.loop_var = tk.BooleanVar()
+        ttk.Checkbutton(frame, text="Loop", variable=self.loop_var, command=lambda: self.toggle_loop(self.node)).pack(anchor=tk.W, pady=(5,0))
 
-        ttk.Label(self, text="Recorded Actions:").pack(anchor=tk.W)
-        self.actions_listbox = tk.Listbox(self, height=5)
-        self.actions_listbox.pack(fill=tk.BOTH, expand=True)
-        for idx, action in enumerate(node.actions):
-            self.actions_listbox.insert(tk.END, f"{idx+1}: {action}")
+        ttk.Label(frame, text="Recorded Actions:").pack(anchor=tk.W)
+        self.actions_list = VirtualList(frame, height=5)
+        self.actions_list.pack(fill=tk.X)
 
-        ttk.Button(self, text="Record", command=lambda: self.record_actions(node)).pack(pady=(5, 0))
+        ttk.Button(frame, text="Record", command=lambda: self.record_actions(self.node)).pack(pady=(5, 0))
+        return frame
 
     def toggle_loop(self, node):
         node.loop = self.loop_var.get()
         node.refresh_appearance()
 
     def record_actions(self, node):
-        messagebox.showinfo("Record", "Recording started... Press OK to stop.")
-        node.actions = ["MoveTo (100,100)", "Click", "MoveTo (200,200)", "Click"]
+        dialog = tk.Toplevel(self)
+        dialog.title("Record")
+        ttk.Label(dialog, text="Recording... click Stop to finish.").pack(padx=20, pady=(15, 5))
+        bounds = []
+
+        def stop():
+            # Measured now, in case the dialog was moved while recording
+            x, y = dialog.winfo_rootx(), dialog.winfo_rooty()
+            bounds.append((x, y, x + dialog.winfo_width(), y + dialog.winfo_height()))
+            dialog.destroy()
+
+        # Not focusable, so Enter and Space stay part of the recording; only a click stops it
+        ttk.Button(dialog, text="Stop", takefocus=False, command=stop).pack(pady=(0, 15))
+        dialog.protocol("WM_DELETE_WINDOW", stop)
+        recorder = Recorder()
+        recorder.start()
+        try:
+            self.wait_window(dialog)
+        finally:
+            events = recorder.stop()
+        if bounds:
+            events = drop_stop_click(events, bounds[0])
+        node.actions = recorder.actions(events)
         self.set_node(node)
 
-    def build_observer_properties(self, node):
-        self.interrupt_var = tk.BooleanVar(value=node.interrupt)
-        ttk.Checkbutton(self, text="Interrupt", variable=self.interrupt_var, command=lambda: self.toggle_interrupt(node)).pack(anchor=tk.W, pady=(5,0))
+    def build_observer_properties(self):
+        frame = ttk.Frame(self.body)
+        self.interrupt_var = tk.BooleanVar()
+        ttk.Checkbutton(frame, text="Interrupt", variable=self.interrupt_var, command=lambda: self.toggle_interrupt(self.node)).pack(anchor=tk.W, pady=(5,0))
+
+        ttk.Label(frame, text="Priority:").pack(anchor=tk.W)
+        self.priority_var = tk.IntVar()
+        priority = ttk.Spinbox(frame, from_=-100, to=100, textvariable=self.priority_var, width=5,
+                               command=lambda: self.apply_priority(self.node))
+        # command only fires on the arrows; typed values apply on Enter or leaving the field
+        priority.bind("<Return>", lambda event: self.apply_priority(self.node))
+        priority.bind("<FocusOut>", lambda event: self.apply_priority(self.node))
+        priority.pack(anchor=tk.W)
 
-        ttk.Label(self, text="On Trigger:").pack(anchor=tk.W, pady=(5,0))
-        action_labels = [n.label for n in self.canvas.nodes if n.type == "Action"]
-        options = action_labels if action_labels else [""]
-        self.selected_action = tk.StringVar(value=node.outgoing[0].label if node.outgoing else options[0])
-        self.action_menu = ttk.OptionMenu(self, self.selected_action, self.selected_action.get(), *options)
+        ttk.Label(frame, text="On Trigger:").pack(anchor=tk.W, pady=(5,0))
+        self.selected_action = tk.StringVar()
+        self.action_menu = ttk.OptionMenu(frame, self.selected_action, "")
         self.action_menu.pack(fill=tk.X)
-        ttk.Button(self, text="Apply", command=lambda: self.apply_trigger(node)).pack(pady=(5, 0))
+        ttk.Button(frame, text="Apply", command=lambda: self.apply_trigger(self.node)).pack(pady=(5, 0))
+        return frame
+
+    def refresh_trigger_menu(self, node):
+        """Rebuild the action dropdown only when the canvas's Action nodes have changed."""
+        actions = self.canvas.action_nodes
+        if self._menu_version != self.canvas.action_version:
+            self._menu_version = self.canvas.action_version
+            menu = self.action_menu["menu"]
+            menu.delete(0, tk.END)
+            for target in actions:
+                menu.add_command(label=target.label, command=lambda t=target: self.select_trigger(t))
+        default = node.outgoing[0] if node.outgoing else next(iter(actions), None)
+        self.select_trigger(default)
+
+    def select_trigger(self, target):
+        self._trigger_target = target
+        self.selected_action.set(target.label if target is not None else "")
 
     def toggle_interrupt(self, node):
         node.interrupt = self.interrupt_var.get()
         node.refresh_appearance()
 
+    def apply_priority(self, node):
+        if node is None:
+            return
+        try:
+            node.priority = self.priority_var.get()
+        except tk.TclError:
+            # Not an integer; show the node's priority again
+            self.priority_var.set(node.priority)
+
     def apply_trigger(self, node):
         # Remove existing outgoing
         for dst in list(node.outgoing):
-            # Find and remove edge
-            for edge in list(self.canvas.edges):
-                if edge.source == node and edge.target == dst:
-                    self.canvas.remove_edge(edge)
+            edge = self.canvas.edges.get(node, dst)
+            if edge is not None:
+                self.canvas.remove_edge(edge)
         node.outgoing.clear()
         node.incoming.clear()
-        # Find selected action node
-        target_label = self.selected_action.get()
-        for n in self.canvas.nodes:
-            if n.label == target_label and n.type == "Action":
-                self.canvas.add_edge(node, n)
-                break
+        if self._trigger_target in self.canvas.action_nodes:
+            self.canvas.add_edge(node, self._trigger_target)
         self.set_node(node)
 
     def remove_edge(self, edge):
         self.canvas.remove_edge(edge)
         self.set_node(self.node)  # Refresh panel after change
 
-    def delete_node(self):
-        if self.node:
-            self.node.delete()
-            self.node = None
-            self.clear_panel()
-
     def remove_edge_pair(self, source_node, target_node):
         """
         Find the EdgeWidget in canvas.edges such that
          edge.source == source_node and edge.target == target_node,
         then remove it.
         """
-        for edge in list(self.canvas.edges):
-            if edge.source == source_node and edge.target == target_node:
-                self.canvas.remove_edge(edge)
-                break
+        edge = self.canvas.edges.get(source_node, target_node)
+        if edge is not None:
+            self.canvas.remove_edge(edge)
         if self.node:
             self.set_node(self.node)
 
@@ -157,4 +279,4 @@ class PropertyPanel(tk.LabelFrame):
         if self.node:
             self.node.delete()
             self.node = None
-            self.clear_panel()
\ No newline at end of file
+            self.clear_panel()
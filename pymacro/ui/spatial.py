@@ -0,0 +1,89 @@
+import math
+
+
+class GridIndex:
+    """
+    Uniform-grid spatial index of axis-aligned boxes. Each key is stored in
+    every cell its box touches, so point and rectangle queries only look at
+    the keys in the cells they cover.
+    """
+
+    def __init__(self, cell_size=200):
+        self.cell_size = cell_size
+        self._boxes = {}  # key -> (x1, y1, x2, y2)
+        self._cells = {}  # (col, row) -> {key: None}
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, key):
+        return key in self._boxes
+
+    def _cell_range(self, box):
+        x1, y1, x2, y2 = box
+        size = self.cell_size
+        return (math.floor(x1 / size), math.floor(y1 / size),
+                math.floor(x2 / size), math.floor(y2 / size))
+
+    def _cells_of(self, cell_range):
+        c1, r1, c2, r2 = cell_range
+        return ((c, r) for c in range(c1, c2 + 1) for r in range(r1, r2 + 1))
+
+    def insert(self, key, box):
+        """Add ``key`` or move it to ``box``; cells are only touched when the covered range changes."""
+        old = self._boxes.get(key)
+        self._boxes[key] = box
+        new_range = self._cell_range(box)
+        if old is not None:
+            old_range = self._cell_range(old)
+            if old_range == new_range:
+                return
+            for cell in self._cells_of(old_range):
+                bucket = self._cells.get(cell)
+                if bucket is not None:
+                    bucket.pop(key, None)
+                    if not bucket:
+                        del self._cells[cell]
+        for cell in self._cells_of(new_range):
+            self._cells.setdefault(cell, {})[key] = None
+
+    update = insert
+
+    def remove(self, key):
+        box = self._boxes.pop(key, None)
+        if box is None:
+            return
+        for cell in self._cells_of(self._cell_range(box)):
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._cells[cell]
+
+    def query(self, box):
+        """Keys whose boxes intersect ``box``."""
+        x1, y1, x2, y2 = box
+        c1, r1, c2, r2 = self._cell_range(box)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > len(self._cells):
+            # Box covers more cells than are occupied: walk the occupied ones
+            buckets = [b for (c, r), b in self._cells.items() if c1 <= c <= c2 and r1 <= r <= r2]
+        else:
+            buckets = [self._cells[cell] for cell in self._cells_of((c1, r1, c2, r2)) if cell in self._cells]
+        found = set()
+        for bucket in buckets:
+            for key in bucket:
+                if key not in found:
+                    bx1, by1, bx2, by2 = self._boxes[key]
+                    if bx1 <= x2 and x1 <= bx2 and by1 <= y2 and y1 <= by2:
+                        found.add(key)
+        return found
+
+    def at(self, x, y):
+        """Keys whose boxes contain the point."""
+        bucket = self._cells.get((math.floor(x / self.cell_size), math.floor(y / self.cell_size)), {})
+        hits = []
+        for key in bucket:
+            x1, y1, x2, y2 = self._boxes[key]
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                hits.append(key)
+        return hits
@@ -1,5 +1,7 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+
+MACRO_FILETYPES = [("Macro files", "*.pymacro"), ("All files", "*.*")]
 
 class ToolbarPanel(tk.Frame):
     def __init__(self, master, canvas):
@@ -7,6 +9,8 @@ class ToolbarPanel(tk.Frame):
         self.canvas = canvas
         ttk.Button(self, text="Add Observer", command=self.add_observer).pack(side=tk.LEFT, padx=5, pady=5)
         ttk.Button(self, text="Add Action", command=self.add_action).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(self, text="Open", command=self.open_macro).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(self, text="Save", command=self.save_macro).pack(side=tk.LEFT, padx=5, pady=5)
         # Help button on top-right
         self.help_btn = ttk.Button(self, text="?", width=2, command=self.show_help)
         self.help_btn.pack(side=tk.RIGHT, padx=5, pady=5)
@@ -17,5 +21,15 @@ class ToolbarPanel(tk.Frame):
     def add_action(self):
         self.canvas.add_node(200, 200, f"act_{len(self.canvas.nodes)}", "Action")
 
+    def open_macro(self):
+        path = filedialog.askopenfilename(filetypes=MACRO_FILETYPES)
+        if path:
+            self.canvas.load(path)
+
+    def save_macro(self):
+        path = filedialog.asksaveasfilename(defaultextension=".pymacro", filetypes=MACRO_FILETYPES)
+        if path:
+            self.canvas.save(path)
+
     def show_help(self):
         messagebox.showinfo("Help", "Left-click on a node to edit its properties.\nRight-click and drag from one node to another to connect.")